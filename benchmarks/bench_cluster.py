@@ -0,0 +1,90 @@
+"""Scaling benchmark of `lab ls`, `lab jobs` and `lab bash` against a fake SLURM cluster.
+
+For each cluster size, reports the number of SLURM commands issued (each one
+a subprocess on a real cluster), the wall time and the peak Python memory.
+
+Usage: python benchmarks/bench_cluster.py [--sizes 10:100,1000:10000] [--commands ls,jobs,bash]
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+import tracemalloc
+
+from labsync import cluster
+from labsync.command_backend import set_backend
+from labsync.fake_slurm import FakeSlurm
+
+DEFAULT_SIZES = '10:100,1000:1000,1000:10000,10000:100000'
+
+# Command line of each benchmarked command; caches and the daemon are bypassed
+# so that every run queries the (fake) cluster.
+COMMANDS = {
+    'ls': (cluster.cluster_ls, ['ls', '--no-daemon', '--refresh', '--cache-ttl', '0']),
+    'jobs': (cluster.cluster_jobs, ['jobs', '--no-daemon']),
+    'bash': (cluster.cluster_bash, ['bash']),
+}
+
+
+def run_once(fake, command):
+    func, argv = COMMANDS[command]
+    args = cluster.get_parser().parse_args(argv)
+    fake.reset_calls()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(args)
+    return len(fake.calls)
+
+
+def bench(fake, command, repeat, measure_memory):
+    # Warm-up run, so that generating the fake output is not measured
+    run_once(fake, command)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        calls = run_once(fake, command)
+        best = min(best, time.perf_counter() - start)
+    peak_mb = None
+    if measure_memory:
+        tracemalloc.start()
+        run_once(fake, command)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return calls, best, peak_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=str, default=DEFAULT_SIZES,
+                        help=f'Comma-separated NODES:JOBS cluster sizes (default: {DEFAULT_SIZES})')
+    parser.add_argument('--commands', type=str, default=','.join(COMMANDS),
+                        help='Comma-separated commands to benchmark (default: all)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help='Skip the (slower) peak memory measurement')
+    parser.add_argument('--max-calls', type=int, default=None,
+                        help='Fail if any command issues more SLURM commands than this')
+    args = parser.parse_args()
+
+    commands = args.commands.split(',')
+    print(f"{'Nodes':>7} {'Jobs':>8} {'Command':<8} {'SLURM calls':>11} {'Wall':>10} {'Peak mem':>10}")
+    failed = False
+    for size in args.sizes.split(','):
+        num_nodes, num_jobs = (int(value) for value in size.split(':'))
+        fake = FakeSlurm(num_nodes=num_nodes, num_jobs=num_jobs)
+        previous = set_backend(fake)
+        try:
+            for command in commands:
+                calls, wall, peak_mb = bench(fake, command, args.repeat, not args.no_memory)
+                peak = f'{peak_mb:.1f}MB' if peak_mb is not None else '-'
+                print(f'{num_nodes:>7} {num_jobs:>8} {command:<8} {calls:>11} {wall * 1000:>8.1f}ms {peak:>10}')
+                if args.max_calls is not None and calls > args.max_calls:
+                    print(f'FAIL: {command} issued {calls} SLURM commands, more than {args.max_calls}')
+                    failed = True
+        finally:
+            set_backend(previous)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Micro-benchmark for labsync.slurm_parser over a synthetic cluster dump.
+
+Usage: python benchmarks/bench_slurm_parser.py [--jobs 10000] [--nodes 1000]
+"""
+import argparse
+import random
+import sys
+import time
+
+from labsync.slurm_parser import parse_jobs, parse_nodes
+
+
+def synthetic_nodes(num_nodes):
+    lines = []
+    for i in range(num_nodes):
+        gpu_type = 'a100' if i % 2 else 'v100'
+        lines.append(
+            f'NodeName=gpu{i:04d} Arch=x86_64 CoresPerSocket=16 CPUAlloc=8 CPUTot=64 '
+            f'AvailableFeatures={gpu_type},gpu ActiveFeatures={gpu_type},gpu '
+            f'Gres=gpu:{gpu_type}:8(S:0-1) NodeAddr=gpu{i:04d} NodeHostName=gpu{i:04d} '
+            f'OS=Linux 5.15.0-91-generic #101-Ubuntu SMP RealMemory=1024000 '
+            f'State=MIXED Partitions=gpu,preempt '
+            f'CfgTRES=cpu=64,mem=1000G,billing=64,gres/gpu=8 '
+            f'AllocTRES=cpu=8,mem=128G,gres/gpu=2')
+    return '\n'.join(lines)
+
+
+def synthetic_jobs(num_jobs, num_nodes, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(num_jobs):
+        job_id = 100000 + i
+        gpus = rng.choice([1, 2, 4, 8])
+        first = rng.randrange(num_nodes - 1)
+        if rng.random() < 0.1:
+            node_list = f'gpu[{first:04d}-{first + 1:04d}]'
+            detail = (f'Nodes=gpu{first:04d} CPU_IDs=0-7 Mem=65536 GRES=gpu:a100:{gpus}(IDX:0-{gpus - 1}) '
+                      f'Nodes=gpu{first + 1:04d} CPU_IDs=0-7 Mem=65536 GRES=gpu:a100:{gpus}(IDX:0-{gpus - 1})')
+            num = 2
+        else:
+            node_list = f'gpu{first:04d}'
+            detail = f'Nodes={node_list} CPU_IDs=0-7 Mem=65536 GRES=gpu:a100:{gpus}(IDX:0-{gpus - 1})'
+            num = 1
+        lines.append(
+            f'JobId={job_id} JobName=train_{i} UserId=user{i % 50}(1{i % 50:03d}) GroupId=lab(100) '
+            f'Priority=1000 Nice=0 Account=lab QOS=normal JobState=RUNNING Reason=None '
+            f'Requeue=1 Restarts=0 BatchFlag=1 ExitCode=0:0 RunTime=01:00:00 TimeLimit=2-00:00:00 '
+            f'Partition=gpu NodeList={node_list} NumNodes={num} NumCPUs=8 '
+            f'ReqTRES=cpu=8,mem=64G,node={num},billing=8,gres/gpu={gpus * num} '
+            f'AllocTRES=cpu=8,mem=64G,node={num},billing=8,gres/gpu={gpus * num},gres/gpu:a100={gpus * num} '
+            f'{detail} MinCPUsNode=8 TresPerNode=gres/gpu:{gpus} '
+            f'Command=/home/user/run.sh --lr 0.1 WorkDir=/home/user StdOut=/home/user/slurm/slurm-{job_id}.out')
+    return '\n'.join(lines)
+
+
+def bench(name, func, data, records, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - start)
+    per_record_us = best / records * 1e6
+    print(f'{name:<12} {records:>8} records  {best * 1000:>9.1f}ms  {per_record_us:>7.2f}us/record')
+    return per_record_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=10000)
+    parser.add_argument('--nodes', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-us', type=float, default=None,
+                        help='Fail if parsing takes longer than this many microseconds per record')
+    args = parser.parse_args()
+
+    nodes_dump = synthetic_nodes(args.nodes)
+    jobs_dump = synthetic_jobs(args.jobs, args.nodes)
+    print(f'Dump sizes: nodes {len(nodes_dump) / 1e6:.1f}MB, jobs {len(jobs_dump) / 1e6:.1f}MB')
+
+    worst = max(bench('parse_nodes', parse_nodes, nodes_dump, args.nodes, args.repeat),
+                bench('parse_jobs', parse_jobs, jobs_dump, args.jobs, args.repeat))
+    if args.budget_us is not None and worst > args.budget_us:
+        print(f'FAIL: {worst:.2f}us/record exceeds budget of {args.budget_us:.2f}us/record')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
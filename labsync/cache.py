@@ -0,0 +1,52 @@
+"""On-disk cache for slowly changing data, stored under user_data_dir."""
+import os
+import json
+import time
+import socket
+from .utils import user_data_dir
+
+cache_dir = os.path.join(user_data_dir, 'cache')
+
+
+def _cache_file(name):
+    # Keyed by host because user_data_dir may live on a home directory shared
+    # by the login nodes of several clusters.
+    return os.path.join(cache_dir, f'{socket.gethostname()}-{name}.json')
+
+
+def load_cached(name, ttl):
+    """Return the cached value for `name` if it is younger than `ttl` seconds."""
+    path = _cache_file(name)
+    try:
+        with open(path, 'r') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - entry.get('time', 0) > ttl:
+        return None
+    return entry.get('value')
+
+
+def save_cached(name, value):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_file(name)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'time': time.time(), 'value': value}, f)
+    os.replace(tmp_path, path)
+
+
+def cached(name, ttl, compute, refresh=False):
+    """Return a cached value, recomputing it when stale, missing or `refresh` is set.
+
+    `compute` returns None on failure, which is not cached. A `ttl` of 0
+    disables the cache.
+    """
+    if ttl > 0 and not refresh:
+        value = load_cached(name, ttl)
+        if value is not None:
+            return value
+    value = compute()
+    if ttl > 0 and value is not None:
+        save_cached(name, value)
+    return value
@@ -1,171 +1,153 @@
 import argparse
+import asyncio
+import fnmatch
+import itertools
+import json
 import sys
 import subprocess
+import tempfile
+import time
 import re
 import os
-from datetime import datetime
+import shlex
+import shutil
+import statistics
+from datetime import datetime, timedelta
 from collections import defaultdict
+from .cache import cached, load_cached, save_cached
+from .command_backend import get_backend
+from .config import load_config, save_config
+from .cluster_stats import SACCT_FIELDS, UsageStore, format_sacct_time
+from .cluster_efficiency import SACCT_FIELDS as EFFICIENCY_SACCT_FIELDS, parse_sacct_efficiency, suggest_resources
+from .cluster_daemon import DEFAULT_INTERVAL, DEFAULT_SOCKET, read_snapshot, serve
+from .hostlist import HostList, HostMap, expand_hostlist
+from .output import OUTPUT_FORMATS, write_rows
+from .slurm_parser import (JobRecord, NodeRecord, Tres, parse_gpu_gres, parse_jobs, parse_nodes,
+                           parse_slurm_time)
+
+
+# Number of failed run_command calls, so that a refresh can tell whether all its queries succeeded.
+command_failures = 0
 
 
 def run_command(cmd):
-    try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, check=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        print(f"Error running command '{cmd}': {e}")
+    global command_failures
+    returncode, stdout, stderr = get_backend().run(cmd)
+    if returncode != 0:
+        command_failures += 1
+        print(f"Error running command '{cmd}': {stderr.strip() or f'exit status {returncode}'}")
         return ""
+    return stdout.strip()
 
 
-def get_slurm_nodes_detailed():
-    cmd = "scontrol show nodes"
-    output = run_command(cmd)
+DEFAULT_MAX_CONCURRENCY = 8
 
-    nodes = {}
-    current_node = None
 
-    for line in output.split('\n'):
-        line = line.strip()
-        if line.startswith('NodeName='):
-            parts = line.split()
-            for part in parts:
-                if part.startswith('NodeName='):
-                    current_node = part.split('=')[1]
-                    nodes[current_node] = {}
-                elif '=' in part:
-                    key, value = part.split('=', 1)
-                    if current_node:
-                        nodes[current_node][key] = value
-        elif current_node and '=' in line and not line.startswith(' '):
-            parts = line.split()
-            for part in parts:
-                if '=' in part:
-                    key, value = part.split('=', 1)
-                    nodes[current_node][key] = value
-
-    return nodes
+def run_commands(cmds, max_concurrency=DEFAULT_MAX_CONCURRENCY, timeout=None):
+    """Run shell commands concurrently and return {cmd: stdout}.
 
+    At most `max_concurrency` subprocesses run at a time so that a large
+    fan-out does not overload slurmctld. Duplicate commands run only once.
+    A command still running after `timeout` seconds is killed and yields "".
+    """
+    unique_cmds = list(dict.fromkeys(cmds))
+    if not unique_cmds:
+        return {}
+    backend = get_backend()
 
-def get_gpu_types_from_slurm():
-    gpu_types = {}
+    async def run_one(semaphore, cmd):
+        async with semaphore:
+            returncode, stdout, stderr = await backend.run_async(cmd, timeout)
+        if returncode is None:
+            print(f"Timed out running command '{cmd}'")
+            return ""
+        if returncode != 0:
+            print(f"Error running command '{cmd}': {stderr.strip()}")
+            return ""
+        return stdout.strip()
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        return await asyncio.gather(*(run_one(semaphore, cmd) for cmd in unique_cmds))
 
-    cmd = "sinfo -N -o '%N %f %G'"
-    output = run_command(cmd)
+    return dict(zip(unique_cmds, asyncio.run(run_all())))
 
+
+def get_slurm_nodes_detailed():
+    return parse_nodes(run_command("scontrol show nodes -o"))
+
+
+def parse_sinfo_gpu_types(output):
+    gpu_types = HostMap()
     for line in output.split('\n'):
-        if line.strip() and not line.startswith('NODELIST'):
-            parts = line.split()
+        if line.strip():
+            parts = line.split('|')
             if len(parts) >= 3:
-                node_name = parts[0]
-                features = parts[1] if len(parts) > 1 else ''
+                nodes_str = parts[0]
+                features = parts[2]
                 gpu_type = 'unknown'
-                if features and features != 'AVAIL_FEATURES':
-                    feature_parts = features.split(',')
-                    for part in feature_parts:
+                if features and features != '(null)':
+                    for part in features.split(','):
                         if part.strip() != 'gpu' and part.strip():
                             gpu_type = part.strip()
                             break
+                gpu_types.add(nodes_str, gpu_type)
+    return gpu_types
 
-                gpu_types[node_name] = gpu_type
 
-    return gpu_types
+class PartitionMap(HostMap):
+    """Partitions of each node, formatted for display."""
+
+    def get(self, host, default=None):
+        partition_list = sorted(set(self.get_all(host)), key=lambda x: (
+            0 if 'gpu' in x.lower() else 1,  # GPU partitions first
+            x  # Then alphabetical
+        ))
+        if not partition_list:
+            return default
+        return ','.join(partition_list[:2])  # Limit to 2 partitions for display
 
 
-def get_gpu_jobs():
-    cmd = "squeue -h -o '%i|%u|%j|%N|%S|%T|%P' --states=RUNNING,PENDING"
-    output = run_command(cmd)
+def parse_sinfo_partitions(output):
+    node_partitions = PartitionMap()
 
-    all_jobs = {}
     for line in output.split('\n'):
         if line.strip():
             parts = line.split('|')
-            if len(parts) >= 7:
-                job_id = parts[0]
-                user = parts[1]
-                job_name = parts[2]
-                nodes = parts[3]
-                start_time = parts[4]
-                state = parts[5]
-                partition = parts[6]
-
-                all_jobs[job_id] = {
-                    'user': user,
-                    'job_name': job_name,
-                    'nodes': expand_node_list(nodes) if nodes and nodes != '(null)' else [],
-                    'start_time': start_time,
-                    'state': state,
-                    'partition': partition,
-                    'gpu_count': 0,
-                    'gpu_type': 'unknown'
-                }
+            if len(parts) >= 2:
+                node_partitions.add(parts[0], parts[1])
 
-    gpu_jobs = {}
-    for job_id, job_info in all_jobs.items():
-        if job_info['state'] == 'RUNNING':
-            job_detail_cmd = f"scontrol show job {job_id}"
-            job_detail = run_command(job_detail_cmd)
+    return node_partitions
 
-            gpu_count = 0
-            gpu_type = 'generic'
 
-            tres_match = re.search(r'TRES=.*?gres/gpu[^,]*?[:=](\d+)', job_detail, re.IGNORECASE)
-            if tres_match:
-                gpu_count = int(tres_match.group(1))
-            else:
-                patterns = [
-                    r'ReqTRES=.*?gres/gpu[^,]*?[:=](\d+)',
-                    r'AllocTRES=.*?gres/gpu[^,]*?[:=](\d+)',
-                    r'gres/gpu[:=](\d+)',
-                    r'Gres=.*?gpu[^,]*?[:=](\d+)'
-                ]
-
-                for pattern in patterns:
-                    match = re.search(pattern, job_detail, re.IGNORECASE)
-                    if match:
-                        gpu_count = int(match.group(1))
-                        break
-
-            if gpu_count == 0:
-                is_gpu_job = False
-
-                if 'gpu' in job_info['partition'].lower():
-                    is_gpu_job = True
-                    gpu_count = 1
+# Without -N, sinfo reports each group of alike nodes as one hostlist line.
+SINFO_CMD = "sinfo -h -o '%N|%P|%f|%G'"
+NODE_STATE_CMD = "sinfo -N -h -o '%N|%T'"
 
-                gpu_node_prefixes = ['gpu', 'node']
-                for node in job_info['nodes']:
-                    if any(node.startswith(prefix) for prefix in gpu_node_prefixes):
-                        if 'gpu' in job_detail.lower() or 'gres' in job_detail.lower():
-                            is_gpu_job = True
-                            if gpu_count == 0:
-                                gpu_count = 1
-                        break
+# Node names, GRES layout, features and partitions rarely change.
+DEFAULT_TOPOLOGY_TTL = 24 * 3600
 
-            if gpu_count > 0:
-                job_info['gpu_count'] = gpu_count
-                job_info['gpu_type'] = gpu_type
-                gpu_jobs[job_id] = job_info
 
-    return gpu_jobs
+def get_node_states():
+    states = {}
+    for line in run_command(NODE_STATE_CMD).split('\n'):
+        parts = line.strip().split('|')
+        if len(parts) >= 2:
+            # Strip flags such as "down*" (not responding) or "idle~" (powered off)
+            states[parts[0]] = parts[1].upper().rstrip('*~#!%$@^-')
+    return states
 
 
-def expand_node_list(node_string):
-    nodes = []
-    for part in node_string.split(','):
-        if '[' in part and ']' in part:
-            base = part.split('[')[0]
-            range_part = part.split('[')[1].split(']')[0]
-
-            if '-' in range_part:
-                start, end = range_part.split('-')
-                padding = len(start)
-                for i in range(int(start), int(end) + 1):
-                    nodes.append(f"{base}{str(i).zfill(padding)}")
-            else:
-                nodes.append(f"{base}{range_part}")
-        else:
-            nodes.append(part)
+def get_gpu_types_from_slurm():
+    return parse_sinfo_gpu_types(run_command(SINFO_CMD))
+
+
+def get_node_partitions():
+    return parse_sinfo_partitions(run_command(SINFO_CMD))
+
 
-    return nodes
+def expand_node_list(node_string):
+    return expand_hostlist(node_string)
 
 
 def parse_gres(gres_string, node_name, gpu_types):
@@ -208,201 +190,754 @@ def parse_gres(gres_string, node_name, gpu_types):
     return gpus
 
 
-def get_node_partitions():
-    cmd = "sinfo -h -o '%N %P'"
-    output = run_command(cmd)
+# %S is the expected start time for pending jobs, as in `squeue --start`
+SQUEUE_FORMAT = '%i|%u|%j|%N|%S|%T|%P|%b|%M|%l|%r'
 
-    node_partitions = defaultdict(set)
 
+def parse_squeue_jobs(output):
+    jobs = {}
     for line in output.split('\n'):
         if line.strip():
-            parts = line.split()
-            if len(parts) >= 2:
-                nodes_str = parts[0]
-                partition = parts[1]
-
-                nodes = expand_node_list(nodes_str)
-                for node in nodes:
-                    node_partitions[node].add(partition)
-
-    node_partition_map = {}
-    for node, partitions in node_partitions.items():
-        partition_list = list(partitions)
-        partition_list.sort(key=lambda x: (
-            0 if 'gpu' in x.lower() else 1,  # GPU partitions first
-            x  # Then alphabetical
-        ))
-        node_partition_map[node] = ','.join(partition_list[:2])  # Limit to 2 partitions for display
-
-    return node_partition_map
-
-
-def get_allocated_gpus_per_node():
-    gpu_jobs = get_gpu_jobs()
-    allocated_gpus = defaultdict(lambda: defaultdict(int))
-
-    for job_id, job_data in gpu_jobs.items():
-        if job_data['state'] == 'RUNNING':
-            job_detail_cmd = f"scontrol show job {job_id}"
-            job_detail = run_command(job_detail_cmd)
-
-            node_gpu_allocation = {}
-            tres_per_node_match = re.search(r'TresPerNode=([^,\s]+)', job_detail)
-            if tres_per_node_match:
-                tres_info = tres_per_node_match.group(1)
-                gpu_match = re.search(r'gres[/:]gpu[^:=]*[:=](\d+)', tres_info, re.IGNORECASE)
-                if gpu_match:
-                    gpus_per_node = int(gpu_match.group(1))
-                    for node in job_data['nodes']:
-                        node_gpu_allocation[node] = gpus_per_node
-
-            if not node_gpu_allocation:
-                if len(job_data['nodes']) == 1:
-                    # Single node job - all GPUs are on this node
-                    node_gpu_allocation[job_data['nodes'][0]] = job_data['gpu_count']
+            parts = line.split('|')
+            if len(parts) >= 11:
+                nodes = parts[3]
+                jobs[parts[0]] = {
+                    'user': parts[1],
+                    'job_name': parts[2],
+                    'nodes': HostList(nodes),
+                    'node_list': nodes,
+                    'start_time': parts[4],
+                    'state': parts[5],
+                    'partition': parts[6],
+                    'tres_per_node': parts[7],
+                    'time': parts[8],
+                    'time_limit': parts[9],
+                    'reason': parts[10],
+                    'gpu_count': 0,
+                    'gpu_type': 'unknown'
+                }
+    return jobs
+
+
+def job_gpus_per_node(job_info, job_detail):
+    gpus_per_node = job_detail.gpus_per_node if job_detail is not None else 0
+    return gpus_per_node or parse_gpu_gres(job_info.get('tres_per_node'))[0]
+
+
+def job_gpu_count(job_info, job_detail):
+    if job_detail is not None and job_detail.gpu_count:
+        return job_detail.gpu_count
+
+    gpus_per_node = job_gpus_per_node(job_info, job_detail)
+    if gpus_per_node:
+        return gpus_per_node * max(len(job_info['nodes']), 1)
+
+    if 'gpu' in job_info['partition'].lower():
+        return 1
+
+    gpu_node_prefixes = ['gpu', 'node']
+    for node in job_info['nodes']:
+        if any(node.startswith(prefix) for prefix in gpu_node_prefixes):
+            if job_detail is not None and job_detail.mentions_gpu:
+                return 1
+            break
+
+    return 0
+
+
+def pending_job_gpu_request(job_info, job_detail):
+    """Return (gpu_count, gpu_type) requested by a pending job, (0, None) if none."""
+    gpus_per_node, squeue_type = parse_gpu_gres(job_info.get('tres_per_node'))
+    if job_detail is not None:
+        gpu_type = job_detail.gpu_type or squeue_type
+        if job_detail.gpu_count:
+            return job_detail.gpu_count, gpu_type
+        gpus_per_node = job_detail.gpus_per_node or gpus_per_node
+        return gpus_per_node * max(job_detail.num_nodes, 1), gpu_type
+    return gpus_per_node, squeue_type
+
+
+def has_node_gpu_detail(job_info, job_detail):
+    """Whether the per-node GPU allocation of a job can be determined."""
+    if len(job_info['nodes']) <= 1:
+        return True
+    return bool(job_detail.node_gres or job_gpus_per_node(job_info, job_detail))
+
+
+def job_gpu_allocation(job_info, job_detail):
+    """Map each node of a running job to the number of GPUs it holds there."""
+    node_gpu_allocation = {}
+
+    if job_detail is not None:
+        for nodes_str, gpus, _ in job_detail.node_gres:
+            for node in HostList(nodes_str):
+                node_gpu_allocation[node] = gpus
+        if node_gpu_allocation:
+            return node_gpu_allocation
+
+    gpus_per_node = job_gpus_per_node(job_info, job_detail)
+    if gpus_per_node:
+        for node in job_info['nodes']:
+            node_gpu_allocation[node] = gpus_per_node
+        return node_gpu_allocation
+
+    if len(job_info['nodes']) == 1:
+        # Single node job - all GPUs are on this node
+        node_gpu_allocation[job_info['nodes'][0]] = job_info['gpu_count']
+    elif job_info['nodes']:
+        # Multi-node job without per-node detail - even distribution
+        gpu_count_per_node = job_info['gpu_count'] // len(job_info['nodes'])
+        remainder = job_info['gpu_count'] % len(job_info['nodes'])
+
+        for i, node in enumerate(job_info['nodes']):
+            gpus_on_this_node = gpu_count_per_node + (1 if i < remainder else 0)
+            if gpus_on_this_node > 0:
+                node_gpu_allocation[node] = gpus_on_this_node
+
+    return node_gpu_allocation
+
+
+class ClusterSnapshot:
+    """Cluster state gathered with a constant number of bulk SLURM queries.
+
+    Each source is queried at most once and only when first needed:
+    `squeue` for the job list, `scontrol -d show job -o` for job details,
+    `scontrol show nodes -o` for nodes and `sinfo` for features and
+    partitions. Node topology and `sinfo` output are cached on disk for
+    `cache_ttl` seconds, so only job and node states are queried live.
+
+    If a `lab cluster daemon` is serving this host, its snapshot is used
+    instead and no SLURM command is run at all.
+    """
+
+    def __init__(self, user=None, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 cache_ttl=DEFAULT_TOPOLOGY_TTL, refresh=False, use_daemon=True):
+        self.user = user
+        self.max_concurrency = max_concurrency
+        self.cache_ttl = cache_ttl
+        self.refresh = refresh
+        self.use_daemon = use_daemon and not refresh
+        self.from_daemon = False
+        self._cache = {}
+        self._fetched_job_ids = set()
+        if self.use_daemon:
+            self.load_from_daemon()
+
+    # Entries that change between refreshes of a long-running view.
+    LIVE_ENTRIES = ['jobs', 'job_details', 'gpu_jobs', 'allocated_gpus', 'allocated_gpu_indices', 'nodes']
+
+    def _get(self, name, compute):
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+
+    @property
+    def jobs(self):
+        def compute():
+            cmd = f"squeue -h -o '{SQUEUE_FORMAT}'"
+            if self.user:
+                cmd += f" -u {self.user}"
+            return parse_squeue_jobs(run_command(cmd))
+        return self._get('jobs', compute)
+
+    @property
+    def job_details(self):
+        return self._get('job_details', lambda: parse_jobs(run_command("scontrol -d show job -o")))
+
+    def fetch_job_details(self, job_ids):
+        """Query `scontrol` per job, concurrently, for details missing in bulk output.
+
+        Some SLURM versions do not report per-node GRES in the bulk job dump.
+        Each job ID is fetched at most once per snapshot.
+        """
+        details = self.job_details
+        missing = [job_id for job_id in dict.fromkeys(job_ids)
+                   if job_id not in self._fetched_job_ids]
+        self._fetched_job_ids.update(missing)
+        cmds = {job_id: f"scontrol -d show job -o {job_id}" for job_id in missing}
+        outputs = run_commands(cmds.values(), self.max_concurrency)
+        for job_id, cmd in cmds.items():
+            for record in parse_jobs(outputs[cmd]).values():
+                details[job_id] = record
+
+    def refresh_live(self):
+        """Drop live state so that it is re-queried, keeping the topology."""
+        for name in self.LIVE_ENTRIES:
+            self._cache.pop(name, None)
+        if self.cache_ttl <= 0:
+            self._cache.pop('node_topology', None)
+        self._fetched_job_ids.clear()
+        if self.use_daemon:
+            self.load_from_daemon()
+
+    def to_payload(self):
+        """Serialize the full snapshot, including per-job fan-out, for the daemon.
+
+        Returns None if a SLURM query failed, so that an empty cluster is not
+        served as if it were real; everything is queried again next time.
+        """
+        failures = command_failures
+        # Resolving allocations triggers any per-job queries beforehand
+        self.allocated_gpus
+        payload = {
+            'jobs': {job_id: {key: value for key, value in job_info.items() if key != 'nodes'}
+                     for job_id, job_info in self.jobs.items()},
+            'job_details': {job_id: job.to_dict() for job_id, job in self.job_details.items()},
+            'nodes': {name: node.to_dict() for name, node in self.nodes.items()},
+            'sinfo': self.sinfo,
+        }
+        if command_failures != failures:
+            self._cache.clear()
+            self._fetched_job_ids.clear()
+            return None
+        return payload
+
+    def load_from_daemon(self):
+        payload = read_snapshot()
+        self.from_daemon = payload is not None
+        if payload is None:
+            return
+        jobs = {}
+        for job_id, job_info in payload['jobs'].items():
+            if self.user and job_info['user'] != self.user:
+                continue
+            job_info['nodes'] = HostList(job_info['node_list'])
+            jobs[job_id] = job_info
+        self._cache['jobs'] = jobs
+        self._cache['job_details'] = {job_id: JobRecord.from_dict(data)
+                                      for job_id, data in payload['job_details'].items()}
+        self._cache['nodes'] = {name: NodeRecord.from_dict(data)
+                                for name, data in payload['nodes'].items()}
+        self._cache['sinfo'] = payload['sinfo']
+        # The daemon has already fetched any per-job detail
+        self._fetched_job_ids.update(jobs)
+
+    @property
+    def nodes(self):
+        def compute():
+            # An empty topology means scontrol failed and is not cached
+            topology = self._get('node_topology', lambda: cached(
+                'slurm_node_records', self.cache_ttl,
+                lambda: {name: node.to_dict() for name, node in get_slurm_nodes_detailed().items()} or None,
+                refresh=self.refresh) or {})
+            nodes = {name: NodeRecord.from_dict(data) for name, data in topology.items()}
+            if self.cache_ttl > 0:
+                for node_name, state in get_node_states().items():
+                    if node_name in nodes:
+                        nodes[node_name].state = state
+            return nodes
+        return self._get('nodes', compute)
+
+    @property
+    def sinfo(self):
+        return self._get('sinfo', lambda: cached(
+            'sinfo', self.cache_ttl, lambda: run_command(SINFO_CMD) or None, refresh=self.refresh) or '')
+
+    @property
+    def gpu_types(self):
+        return self._get('gpu_types', lambda: parse_sinfo_gpu_types(self.sinfo))
+
+    @property
+    def node_partitions(self):
+        return self._get('node_partitions', lambda: parse_sinfo_partitions(self.sinfo))
+
+    @property
+    def gpu_jobs(self):
+        def compute():
+            gpu_jobs = {}
+            details = self.job_details
+            running = {job_id: job_info for job_id, job_info in self.jobs.items()
+                       if job_info['state'] == 'RUNNING'}
+            self.fetch_job_details([
+                job_id for job_id, job_info in running.items()
+                if job_id not in details
+                or (job_gpu_count(job_info, details[job_id]) > 0
+                    and not has_node_gpu_detail(job_info, details[job_id]))
+            ])
+            for job_id, job_info in self.jobs.items():
+                if job_info['state'] == 'RUNNING':
+                    gpu_count = job_gpu_count(job_info, details.get(job_id))
+                    gpu_type = 'generic'
+                elif job_info['state'] == 'PENDING':
+                    gpu_count, gpu_type = pending_job_gpu_request(job_info, details.get(job_id))
                 else:
-                    # Multi-node job - try to get more detailed information
-                    # Look for specific node mentions in the job details
-                    for node in job_data['nodes']:
-                        # Check if this specific node is mentioned with GPU allocation
-                        node_pattern = rf'{re.escape(node)}.*?gres/gpu[^:=]*[:=](\d+)'
-                        node_match = re.search(node_pattern, job_detail, re.IGNORECASE)
-                        if node_match:
-                            node_gpu_allocation[node] = int(node_match.group(1))
-
-                    # If still no specific allocation found, fall back to even distribution
-                    if not node_gpu_allocation:
-                        gpu_count_per_node = job_data['gpu_count'] // len(job_data['nodes'])
-                        remainder = job_data['gpu_count'] % len(job_data['nodes'])
-
-                        for i, node in enumerate(job_data['nodes']):
-                            gpus_on_this_node = gpu_count_per_node + (1 if i < remainder else 0)
-                            if gpus_on_this_node > 0:
-                                node_gpu_allocation[node] = gpus_on_this_node
-
-            for node, gpu_count in node_gpu_allocation.items():
+                    continue
                 if gpu_count > 0:
-                    allocated_gpus[node][job_id] = gpu_count
-
-    return allocated_gpus
+                    job_info['gpu_count'] = gpu_count
+                    job_info['gpu_type'] = gpu_type or 'generic'
+                    gpu_jobs[job_id] = job_info
+            return gpu_jobs
+        return self._get('gpu_jobs', compute)
+
+    @property
+    def allocated_gpu_indices(self):
+        """GPU indices held by each job on each node, where `scontrol -d` reports them."""
+        def compute():
+            indices = defaultdict(dict)
+            details = self.job_details
+            for job_id, job_data in self.gpu_jobs.items():
+                job_detail = details.get(job_id)
+                if job_data['state'] != 'RUNNING' or job_detail is None:
+                    continue
+                for nodes_str, _, gpu_indices in job_detail.node_gres:
+                    if gpu_indices:
+                        for node in HostList(nodes_str):
+                            indices[node][job_id] = gpu_indices
+            return indices
+        return self._get('allocated_gpu_indices', compute)
+
+    @property
+    def allocated_gpus(self):
+        def compute():
+            allocated_gpus = defaultdict(lambda: defaultdict(int))
+            details = self.job_details
+            for job_id, job_data in self.gpu_jobs.items():
+                if job_data['state'] != 'RUNNING':
+                    continue
+                allocation = job_gpu_allocation(job_data, details.get(job_id))
+                for node, gpu_count in allocation.items():
+                    if gpu_count > 0:
+                        allocated_gpus[node][job_id] = gpu_count
+            return allocated_gpus
+        return self._get('allocated_gpus', compute)
 
 
-def cluster_ls(args):
-    print("=" * 130)
-    print(f"{'GPU Status Report':<50} Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("=" * 130)
+def get_gpu_jobs():
+    return ClusterSnapshot().gpu_jobs
 
-    nodes = get_slurm_nodes_detailed()
-    gpu_jobs = get_gpu_jobs()
-    allocated_gpus = get_allocated_gpus_per_node()
-    gpu_types = get_gpu_types_from_slurm()
-    node_partitions = get_node_partitions()
 
-    header = f"{'Node':<12} {'GPU':<4} {'Type':<25} {'Status':<12} {'Job ID':<10} {'User':<12} {'Job Name':<20} {'Start Time':<15}"
-    print(header)
-    print("-" * 130)
-
-    total_gpus = 0
-    available_gpus = 0
-    allocated_gpu_count = 0
-    pending_gpu_requests = 0
+def get_allocated_gpus_per_node():
+    return ClusterSnapshot().allocated_gpus
+
+
+QUEUE_HISTORY_DAYS = 7
+QUEUE_HISTORY_TTL = 6 * 3600
+
+
+def format_duration(seconds):
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes}m"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 48:
+        return f"{hours}h {minutes:02d}m"
+    return f"{hours // 24}d {hours % 24}h"
+
+
+def get_queue_wait_history(ttl=QUEUE_HISTORY_TTL, refresh=False):
+    """Median queue wait of recent GPU jobs, keyed by "partition|gpu_type", or None if sacct failed.
+
+    Built from one `sacct` query over the last QUEUE_HISTORY_DAYS days and
+    cached on disk, also when empty (no recent GPU jobs). The "partition|"
+    key aggregates all GPU types.
+    """
+    def compute():
+        since = (datetime.now() - timedelta(days=QUEUE_HISTORY_DAYS)).strftime('%Y-%m-%dT%H:%M:%S')
+        # Failures are not printed, as the history is only an estimate shown in reports
+        returncode, output, _ = get_backend().run(f"sacct -a -X -n -P -S {since} -o Partition,Submit,Start,ReqTRES")
+        if returncode != 0:
+            return None
+        waits = defaultdict(list)
+        for line in output.split('\n'):
+            parts = line.split('|')
+            if len(parts) < 4:
+                continue
+            submit = parse_slurm_time(parts[1])
+            start = parse_slurm_time(parts[2])
+            tres = Tres.parse(parts[3])
+            if submit is None or start is None or not tres.gpus:
+                continue
+            wait = (start - submit).total_seconds()
+            waits[f"{parts[0]}|"].append(wait)
+            if tres.gpu_type:
+                waits[f"{parts[0]}|{tres.gpu_type}"].append(wait)
+        return {key: [statistics.median(values), len(values)] for key, values in waits.items()}
+    return cached('queue_wait_history', ttl, compute, refresh=refresh)
+
+
+def estimate_queue_wait(history, partition, gpu_type=None):
+    """Typical wait in seconds for a job pending on `partition`, None if unknown.
+
+    A job pending on several partitions starts on whichever frees up first,
+    so the shortest typical wait among them is used.
+    """
+    estimates = []
+    for name in partition.split(','):
+        entry = history.get(f"{name}|{gpu_type or ''}") or history.get(f"{name}|")
+        if entry:
+            estimates.append(entry[0])
+    return min(estimates) if estimates else None
+
+
+# Per-node utilization query; `{node}` is replaced by the node name.
+DEFAULT_UTIL_CMD = os.environ.get(
+    'LABSYNC_UTIL_CMD',
+    "ssh -o BatchMode=yes -o ConnectTimeout=5 {node} "
+    "nvidia-smi --query-gpu=index,utilization.gpu,memory.used,memory.total --format=csv,noheader,nounits")
+DEFAULT_UTIL_TIMEOUT = 10
+# Node queries do not touch slurmctld, so they fan out much wider than SLURM queries.
+DEFAULT_UTIL_CONCURRENCY = 64
+UTIL_CACHE_TTL = 10
+
+
+def parse_gpu_utilization(output):
+    """Parse `index, utilization, memory used, memory total` CSV lines into {index: usage}."""
+    usage = {}
+    for line in output.splitlines():
+        fields = [field.strip() for field in line.split(',')]
+        if len(fields) < 4 or not fields[0].isdigit():
+            continue
+        try:
+            usage[int(fields[0])] = {
+                'util': int(float(fields[1])),
+                'memory_used_mb': int(float(fields[2])),
+                'memory_total_mb': int(float(fields[3])),
+            }
+        except ValueError:
+            continue
+    return usage
+
+
+def collect_gpu_utilization(nodes, command=DEFAULT_UTIL_CMD, timeout=DEFAULT_UTIL_TIMEOUT,
+                            max_concurrency=DEFAULT_UTIL_CONCURRENCY, cache_ttl=UTIL_CACHE_TTL):
+    """Return {node: {gpu index: usage}} by running `command` for every node in parallel.
+
+    Nodes that time out or fail are left out. Results are cached for
+    `cache_ttl` seconds so that repeated `lab ls --util` calls stay cheap.
+    """
+    nodes = list(nodes)
+    cache_name = 'gpu-utilization'
+    entry = load_cached(cache_name, cache_ttl) if cache_ttl > 0 else None
+    if entry is not None and entry.get('command') == command:
+        cached_usage = entry['usage']
+        if all(node in cached_usage for node in nodes):
+            return {node: {int(index): usage for index, usage in cached_usage[node].items()}
+                    for node in nodes}
+
+    cmds = {node: command.replace('{node}', shlex.quote(node)) for node in nodes}
+    outputs = run_commands(cmds.values(), max_concurrency, timeout=timeout)
+    utilization = {}
+    for node, cmd in cmds.items():
+        usage = parse_gpu_utilization(outputs.get(cmd, ''))
+        if usage:
+            utilization[node] = usage
+    if cache_ttl > 0:
+        # Failed nodes are cached as empty so they are not retried every call
+        save_cached(cache_name, {'command': command,
+                                 'usage': {node: utilization.get(node, {}) for node in nodes}})
+    return utilization
+
+
+def gpu_nodes(snapshot):
+    """Names of the nodes that have GPUs and can be queried."""
+    return [name for name, node in snapshot.nodes.items()
+            if node.gres and 'gpu' in node.gres and not is_node_unavailable(node.state)]
+
+
+GPU_ROW_FIELDS = ['node', 'gpu', 'type', 'partition', 'status', 'node_state',
+                  'job_id', 'user', 'job_name', 'start_time', 'util', 'memory_used_mb']
+
+
+def is_node_unavailable(node_state):
+    return any(bad in node_state for bad in ['DOWN', 'DRAIN', 'FAIL'])
+
+
+def iter_gpu_rows(snapshot, utilization=None):
+    """Yield one dict per GPU in the cluster, as each node is processed.
+
+    `utilization` optionally maps node -> GPU index -> usage, as returned by
+    `collect_gpu_utilization`.
+    """
+    nodes = snapshot.nodes
+    gpu_jobs = snapshot.gpu_jobs
+    allocated_gpus = snapshot.allocated_gpus
+    allocated_gpu_indices = snapshot.allocated_gpu_indices
+    gpu_types = snapshot.gpu_types
+    node_partitions = snapshot.node_partitions
+    utilization = utilization or {}
 
     for node_name, node_info in nodes.items():
-        gres = node_info.get('Gres', '')
-        gres_used = node_info.get('GresUsed', '')
-        node_state = node_info.get('State', 'UNKNOWN')
+        node_state = node_info.state
 
-        node_gpus = parse_gres(gres, node_name, gpu_types)
+        node_gpus = parse_gres(node_info.gres, node_name, gpu_types)
         if not node_gpus:
             continue
 
         node_job_allocations = allocated_gpus.get(node_name, {})
 
-        allocated_gpu_indices = []
+        node_job_indices = allocated_gpu_indices.get(node_name, {})
+
         job_gpu_mapping = {}
 
+        def job_entry(job_id):
+            job_info = gpu_jobs.get(job_id, {})
+            return {
+                'job_id': job_id,
+                'user': job_info.get('user', 'unknown'),
+                'job_name': job_info.get('job_name', 'unknown'),
+                'start_time': job_info.get('start_time', 'unknown')
+            }
+
+        # Place jobs on the GPU indices SLURM reports, then the rest in order
+        for job_id, gpu_indices in node_job_indices.items():
+            for index in gpu_indices:
+                if index < len(node_gpus):
+                    job_gpu_mapping[index] = job_entry(job_id)
+
         gpu_index = 0
         for job_id, gpu_count in node_job_allocations.items():
-            job_info = gpu_jobs.get(job_id, {})
+            if job_id in node_job_indices:
+                continue
             for _ in range(gpu_count):
+                while gpu_index in job_gpu_mapping:
+                    gpu_index += 1
                 if gpu_index < len(node_gpus):
-                    allocated_gpu_indices.append(gpu_index)
-                    job_gpu_mapping[gpu_index] = {
-                        'job_id': job_id,
-                        'user': job_info.get('user', 'unknown'),
-                        'job_name': job_info.get('job_name', 'unknown'),
-                        'start_time': job_info.get('start_time', 'unknown')
-                    }
+                    job_gpu_mapping[gpu_index] = job_entry(job_id)
                     gpu_index += 1
 
-        partition = node_partitions.get(node_name, 'unknown')[:19]  # Limit partition display length
+        partition = node_partitions.get(node_name, 'unknown')
 
         for i, gpu_info in enumerate(node_gpus):
-            total_gpus += 1
-
-            type_partition = f"{gpu_info['type']} {partition}"
-
-            if i in allocated_gpu_indices:
-                status = "ALLOCATED"
-                allocated_gpu_count += 1
-                job_info = job_gpu_mapping[i]
-                job_id = job_info['job_id']
-                user = job_info['user']
-                job_name = job_info['job_name'][:19]
-                start_time = job_info['start_time']
+            row = {
+                'node': node_name,
+                'gpu': i,
+                'type': gpu_info['type'],
+                'partition': partition,
+                'node_state': node_state,
+                'job_id': None,
+                'user': None,
+                'job_name': None,
+                'start_time': None,
+                'util': None,
+                'memory_used_mb': None,
+            }
+            gpu_usage = utilization.get(node_name, {}).get(i)
+            if gpu_usage:
+                row['util'] = gpu_usage['util']
+                row['memory_used_mb'] = gpu_usage['memory_used_mb']
+            if i in job_gpu_mapping:
+                row['status'] = "ALLOCATED"
+                row.update(job_gpu_mapping[i])
+            elif is_node_unavailable(node_state):
+                row['status'] = "UNAVAIL"
             else:
-                status = "AVAILABLE"
-                available_gpus += 1
-                job_id = "-"
-                user = "-"
-                job_name = "-"
-                start_time = "-"
-
-            if node_state in ['DOWN', 'DRAIN', 'FAIL']:
-                if status == "AVAILABLE":
-                    status = f"UNAVAIL"
-                    available_gpus -= 1
-                elif status == "ALLOCATED":
-                    allocated_gpu_count -= 1
-
-            print(f"{node_name:<12} {i:<4} {type_partition:<25} {status:<12} {job_id:<10} {user:<12} {job_name:<20} {start_time:<15}")
+                row['status'] = "AVAILABLE"
+            yield row
+
+
+def gpu_status_lines(snapshot, utilization=None):
+    """Yield the lines of the GPU status report for a snapshot.
+
+    A utilization column is added when `utilization` is given.
+    """
+    yield "=" * 130
+    yield f"{'GPU Status Report':<50} Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+    yield "=" * 130
+
+    header = f"{'Node':<12} {'GPU':<4} {'Type':<25} {'Status':<12} {'Job ID':<10} {'User':<12} {'Job Name':<20} {'Start Time':<15}"
+    if utilization is not None:
+        header += f" {'Util':<5} {'Mem (GB)':<8}"
+    yield header
+    yield "-" * 130
+
+    total_gpus = 0
+    available_gpus = 0
+    allocated_gpu_count = 0
+    pending_gpu_requests = 0
 
+    for row in iter_gpu_rows(snapshot, utilization):
+        total_gpus += 1
+        status = row['status']
+        if status == "AVAILABLE":
+            available_gpus += 1
+        elif status == "ALLOCATED" and not is_node_unavailable(row['node_state']):
+            allocated_gpu_count += 1
+
+        type_partition = f"{row['type']} {row['partition'][:19]}"  # Limit partition display length
+        job_id = row['job_id'] or "-"
+        user = row['user'] or "-"
+        job_name = (row['job_name'] or "-")[:19]
+        start_time = row['start_time'] or "-"
+
+        line = f"{row['node']:<12} {row['gpu']:<4} {type_partition:<25} {status:<12} {job_id:<10} {user:<12} {job_name:<20} {start_time:<15}"
+        if utilization is not None:
+            util = f"{row['util']}%" if row['util'] is not None else "-"
+            memory = f"{row['memory_used_mb'] / 1024:.1f}" if row['memory_used_mb'] is not None else "-"
+            line += f" {util:<5} {memory:<8}"
+        yield line
+
+    gpu_jobs = snapshot.gpu_jobs
     for job_id, job_data in gpu_jobs.items():
         if job_data['state'] == 'PENDING':
             pending_gpu_requests += job_data['gpu_count']
 
-    print("-" * 130)
-    print(f"Summary:")
-    print(f"  Total GPUs: {total_gpus}")
-    print(f"  Available: {available_gpus}")
-    print(f"  Allocated: {allocated_gpu_count}")
-    print(f"  Pending GPU requests: {pending_gpu_requests}")
+    yield "-" * 130
+    yield "Summary:"
+    yield f"  Total GPUs: {total_gpus}"
+    yield f"  Available: {available_gpus}"
+    yield f"  Allocated: {allocated_gpu_count}"
+    yield f"  Pending GPU requests: {pending_gpu_requests}"
 
     if pending_gpu_requests > 0:
-        print(f"\nPending GPU Jobs:")
-        print(f"{'Job ID':<10} {'User':<12} {'GPUs Req':<10} {'Reason':<30}")
-        print("-" * 65)
+        yield ""
+        yield "Pending GPU Jobs:"
+        yield f"{'Job ID':<10} {'User':<12} {'Partition':<12} {'GPUs Req':<14} {'Est. Start':<20} {'Typical Wait':<13} {'Reason':<30}"
+        yield "-" * 115
+        # Fetched once per snapshot, so a watched report does not query it on every refresh
+        history = snapshot._get('queue_wait_history',
+                                lambda: get_queue_wait_history(refresh=snapshot.refresh) or {})
         for job_id, job_data in gpu_jobs.items():
             if job_data['state'] == 'PENDING':
+                gpu_type = job_data['gpu_type'] if job_data['gpu_type'] != 'generic' else None
+                gpus_req = f"{job_data['gpu_count']} {gpu_type or ''}".strip()[:13]
+                est_start = job_data['start_time'] if job_data['start_time'] not in ['N/A', 'Unknown'] else '-'
+                wait = estimate_queue_wait(history, job_data['partition'], gpu_type)
+                wait = format_duration(wait) if wait is not None else '-'
                 reason = job_data.get('reason', 'Unknown')[:29]
-                print(f"{job_id:<10} {job_data['user']:<12} {job_data['gpu_count']:<10} {reason:<30}")
+                yield f"{job_id:<10} {job_data['user']:<12} {job_data['partition'][:11]:<12} {gpus_req:<14} {est_start:<20} {wait:<13} {reason:<30}"
+
+    yield "=" * 130
+
+
+def clip_frame(lines, columns, rows):
+    """Clip a frame to the terminal, ending with a "… N more lines" footer if it is too tall."""
+    if len(lines) > rows:
+        hidden = len(lines) - rows + 1
+        lines = lines[:rows - 1] + [f"… {hidden} more lines"]
+    return [line[:columns] for line in lines]
+
+
+def watch_gpu_status(snapshot, interval, collect_utilization=None):
+    """Redraw the GPU status report every `interval` seconds.
+
+    Only the volatile job and node state is re-queried on each refresh, and
+    only the lines that changed since the previous frame are rewritten.
+    Frames are clipped to the terminal size, so that lines never wrap or
+    scroll off the screen. `collect_utilization`, if given, is called for
+    fresh utilization per frame.
+    """
+    previous = []
+    size = None
+    sys.stdout.write('\x1b[?25l')  # hide cursor
+    try:
+        while True:
+            utilization = collect_utilization() if collect_utilization else None
+            terminal_size = shutil.get_terminal_size()
+            if terminal_size != size:
+                # Redraw everything after a resize
+                size = terminal_size
+                previous = []
+                sys.stdout.write('\x1b[2J')
+            # Leave the last column empty, some terminals wrap on writing it
+            lines = clip_frame(list(gpu_status_lines(snapshot, utilization)),
+                               max(size.columns - 1, 1), max(size.lines - 1, 1))
+            out = []
+            for i, line in enumerate(lines):
+                if i >= len(previous) or previous[i] != line:
+                    out.append(f'\x1b[{i + 1};1H{line}\x1b[K')
+            if len(lines) < len(previous):
+                out.append(f'\x1b[{len(lines) + 1};1H\x1b[J')
+            sys.stdout.write(''.join(out))
+            sys.stdout.flush()
+            previous = lines
+            time.sleep(interval)
+            snapshot.refresh_live()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sys.stdout.write(f'\x1b[{len(previous) + 1};1H\x1b[?25h')
+        sys.stdout.flush()
+
+
+def cluster_ls(args):
+    snapshot = ClusterSnapshot(max_concurrency=args.max_concurrency,
+                               cache_ttl=args.cache_ttl, refresh=args.refresh,
+                               use_daemon=not args.no_daemon)
+    def query_utilization():
+        return collect_gpu_utilization(gpu_nodes(snapshot), args.util_cmd,
+                                       args.util_timeout, args.util_concurrency)
+    collect_utilization = query_utilization if args.util else None
+    if args.format != 'table':
+        utilization = collect_utilization() if collect_utilization else None
+        write_rows(iter_gpu_rows(snapshot, utilization), GPU_ROW_FIELDS, args.format)
+        return
+    if args.watch:
+        watch_gpu_status(snapshot, args.watch, collect_utilization)
+        return
+    utilization = collect_utilization() if collect_utilization else None
+    for line in gpu_status_lines(snapshot, utilization):
+        print(line)
 
-    print("=" * 130)
+
+JOB_ROW_FIELDS = ['job_id', 'job_name', 'state', 'partition', 'nodes', 'start_time',
+                  'time', 'time_limit']
+
+
+def iter_job_rows(jobs):
+    for job_id, job_info in jobs.items():
+        yield {
+            'job_id': job_id,
+            'job_name': job_info['job_name'],
+            'state': job_info['state'],
+            'partition': job_info['partition'],
+            'nodes': job_info['node_list'] if job_info['node_list'] != '(null)' else None,
+            'start_time': job_info['start_time'] if job_info['start_time'] != 'N/A' else None,
+            'time': job_info['time'] if job_info['time'] != 'N/A' else '0:00',
+            'time_limit': job_info['time_limit'],
+        }
+
+
+FOLLOW_REFRESH_INTERVAL = 30
+
+
+def follow_job_logs(snapshot, log_dir, tail_lines, interval=FOLLOW_REFRESH_INTERVAL):
+    """Stream the output logs of all running jobs until none are left.
+
+    The job list is refreshed every `interval` seconds to pick up jobs that
+    start and to drop finished ones.
+    """
+    # Imported here so that other commands do not load watchdog
+    from .log_follow import LogFollower
+
+    follower = LogFollower(tail_lines=tail_lines)
+    followed = {}
+    follower.start()
+    try:
+        while True:
+            running = {job_id: os.path.join(log_dir, f'slurm-{job_id}.out')
+                       for job_id, job_info in snapshot.jobs.items() if job_info['state'] == 'RUNNING'}
+            for job_id, path in running.items():
+                if job_id not in followed:
+                    follower.add(path, job_id)
+                    followed[job_id] = path
+            for job_id in list(followed):
+                if job_id not in running:
+                    follower.remove(followed.pop(job_id))
+            if not snapshot.jobs:
+                print("All jobs have finished")
+                break
+            time.sleep(interval)
+            snapshot.refresh_live()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        follower.stop()
 
 
 def cluster_jobs(args):
-    import os
     username = os.getenv('USER', 'unknown')
 
-    cmd = f"squeue -u {username} -o '%i|%j|%T|%P|%N|%S|%M|%l'"
-    output = run_command(cmd)
+    snapshot = ClusterSnapshot(user=username, use_daemon=not args.no_daemon)
+    if args.follow:
+        follow_job_logs(snapshot, args.log_dir, args.lines)
+        return
+    jobs = snapshot.jobs
 
-    if not output:
-        print(f"No jobs found for user {username}")
+    if args.format != 'table':
+        write_rows(iter_job_rows(jobs), JOB_ROW_FIELDS, args.format)
         return
 
-    lines = output.strip().split('\n')
-    if len(lines) <= 1:
+    if not jobs:
         print(f"No jobs found for user {username}")
         return
 
@@ -414,88 +949,646 @@ def cluster_jobs(args):
     print(header)
     print("-" * 100)
 
-    for line in lines[1:]:
-        if line.strip():
-            parts = line.split('|')
-            if len(parts) >= 8:
-                job_id = parts[0]
-                job_name = parts[1][:19]
-                state = parts[2]
-                partition = parts[3]
-                nodes = parts[4] if parts[4] != '(null)' else 'N/A'
-                start_time = parts[5] if parts[5] != 'N/A' else 'Pending'
-                time_elapsed = parts[6] if parts[6] != 'N/A' else '0:00'
-                time_limit = parts[7] if parts[7] != 'N/A' else 'N/A'
-
-                nodes = nodes[:14]
-                start_time = start_time[:14]
-                time_elapsed = time_elapsed[:9]
-                time_limit = time_limit[:11]
-
-                print(f"{job_id:<10} {job_name:<20} {state:<12} {partition:<12} {nodes:<15} {start_time:<15} {time_elapsed:<10} {time_limit:<12}")
+    for row in iter_job_rows(jobs):
+        job_id = row['job_id']
+        job_name = row['job_name'][:19]
+        state = row['state']
+        partition = row['partition']
+        nodes = (row['nodes'] or 'N/A')[:14]
+        start_time = (row['start_time'] or 'Pending')[:14]
+        time_elapsed = row['time'][:9]
+        time_limit = row['time_limit'][:11]
+
+        print(f"{job_id:<10} {job_name:<20} {state:<12} {partition:<12} {nodes:<15} {start_time:<15} {time_elapsed:<10} {time_limit:<12}")
 
     print("=" * 100)
 
 
+KILL_CHUNK_SIZE = 500
+
+
+def select_jobs(jobs, start_job_id=None, end_job_id=None, name=None, states=None, partition=None):
+    """Return the IDs of jobs matching an ID range and optional filters."""
+    if end_job_id is None:
+        end_job_id = start_job_id
+    selected = []
+    for job_id, job_info in jobs.items():
+        # Array tasks are reported as ID_TASK and heterogeneous job components as ID+N
+        match = re.match(r'\d+', job_id)
+        if start_job_id is not None and not (match and start_job_id <= int(match.group()) <= end_job_id):
+            continue
+        if name and not fnmatch.fnmatch(job_info['job_name'], name):
+            continue
+        if states and job_info['state'] not in states:
+            continue
+        if partition and job_info['partition'] != partition:
+            continue
+        selected.append(job_id)
+    return selected
+
+
 def cluster_kill(args):
-    for job_id in range(args.start_job_id, args.end_job_id + 1):
-        cmd = f"scancel {job_id}"
-        run_command(cmd)
-        print(f"Killed job {job_id}")
+    username = os.getenv('USER', 'unknown')
+    states = [state.strip().upper() for state in args.state.split(',')] if args.state else None
+
+    if args.start_job_id is None and not (args.name or states or args.partition):
+        print("Specify a job ID range or at least one of --name, --state, --partition")
+        return
+
+    # Query SLURM directly; a daemon snapshot may miss newly submitted jobs
+    jobs = ClusterSnapshot(user=username, use_daemon=False).jobs
+    selected = select_jobs(jobs, args.start_job_id, args.end_job_id,
+                           args.name, states, args.partition)
+
+    if not selected:
+        print(f"No matching jobs found for user {username}")
+        return
+
+    if args.dry_run:
+        for job_id in selected:
+            job_info = jobs[job_id]
+            print(f"Would cancel {job_id:<12} {job_info['state']:<12} {job_info['partition']:<12} {job_info['job_name']}")
+        return
+
+    cancelled = []
+    for i in range(0, len(selected), KILL_CHUNK_SIZE):
+        chunk = selected[i:i + KILL_CHUNK_SIZE]
+        returncode, _, stderr = get_backend().run("scancel " + ' '.join(shlex.quote(job_id) for job_id in chunk))
+        if returncode == 0:
+            cancelled.extend(chunk)
+        else:
+            print(f"Error cancelling jobs {chunk[0]}..{chunk[-1]}: {stderr.strip()}")
+
+    by_state = defaultdict(int)
+    for job_id in cancelled:
+        by_state[jobs[job_id]['state']] += 1
+    summary = ', '.join(f"{count} {state}" for state, count in sorted(by_state.items()))
+    print(f"Cancelled {len(cancelled)} of {len(selected)} matching jobs" + (f" ({summary})" if summary else ""))
+
+
+def latest_running_job(user):
+    """ID of the most recently started running job of `user`, None if there is none."""
+    output = run_command(f"squeue -h -u {shlex.quote(user)} -t RUNNING --sort=-S -o %i")
+    lines = output.split()
+    return lines[0] if lines else None
 
 
 def cluster_bash(args):
-    gpu_jobs = get_gpu_jobs()
-    job_id = str(args.job_id)
-    gpu_count = 0
-    if job_id in gpu_jobs:
-        gpu_count = gpu_jobs[job_id]['gpu_count']
+    job_id = args.job_id
+    if job_id is None:
+        job_id = latest_running_job(os.getenv('USER', 'unknown'))
+        if job_id is None:
+            print("You have no running jobs")
+            return
+        print(f"Attaching to your most recent running job {job_id}")
+
+    # Only the target job is queried, not the whole cluster
+    job_detail = next(iter(parse_jobs(run_command(f"scontrol -d show job -o {shlex.quote(job_id)}")).values()), None)
+    if job_detail is None:
+        print(f"Job {job_id} not found")
+        return
+    if job_detail.state != 'RUNNING':
+        print(f"Job {job_id} is {job_detail.state}, not RUNNING")
+        return
+
+    gpu_count = job_detail.gpu_count
+    options = []
+    if args.node:
+        if args.node not in HostList(job_detail.node_list):
+            print(f"Node {args.node} is not part of job {job_id} ({job_detail.node_list})")
+            return
+        options.append(f"--nodelist {args.node} -N 1")
+        node_gpus = [gpus for nodes, gpus, _ in job_detail.node_gres if args.node in HostList(nodes)]
+        if node_gpus:
+            gpu_count = node_gpus[0]
+        elif job_detail.gpus_per_node:
+            gpu_count = job_detail.gpus_per_node
+        elif job_detail.num_nodes > 1:
+            gpu_count //= job_detail.num_nodes
     if gpu_count > 0:
-        cmd = f"srun --jobid {args.job_id} --gpus {gpu_count} --pty bash"
-    else:
-        cmd = f"srun --jobid {args.job_id} --pty bash"
+        options.append(f"--gpus {gpu_count}")
+    if args.overlap:
+        options.append("--overlap")
+    cmd = " ".join([f"srun --jobid {job_id}"] + options + ["--pty bash"])
     print(f"Running: {cmd}")
-    subprocess.run(cmd, shell=True)
+    get_backend().run_interactive(cmd)
+
+
+WAIT_INTERVAL = 10
+WAIT_MAX_INTERVAL = 300
+WAIT_BACKOFF = 1.5
+WAIT_EVENT_FIELDS = ['job_id', 'name', 'state', 'exit_code', 'elapsed']
+# sacct states of jobs that have not finished yet
+ACTIVE_JOB_STATES = {'PENDING', 'RUNNING', 'REQUEUED', 'RESIZING', 'SUSPENDED', 'CONFIGURING', 'COMPLETING'}
+
+
+def poll_job_states(job_ids):
+    """Return {job_id: state} of the given jobs still known to squeue, or None if squeue failed.
+
+    All jobs are looked up with a single `squeue` call. An array job counts
+    as queued while any of its tasks is.
+    """
+    returncode, output, stderr = get_backend().run(f"squeue -h -o '%i|%F|%T' -j {','.join(job_ids)}")
+    if returncode != 0:
+        # squeue rejects job IDs that have left the queue; any other failure
+        # (e.g. slurmctld timing out) says nothing about the jobs
+        if 'Invalid job id' in stderr:
+            return {}
+        print(f"Error running squeue: {stderr.strip() or f'exit status {returncode}'}, polling again later")
+        return None
+    states = {}
+    for line in output.split('\n'):
+        parts = line.split('|')
+        if len(parts) < 3:
+            continue
+        for job_id in (parts[0], parts[1]):
+            if job_id in job_ids and states.get(job_id) != 'RUNNING':
+                states[job_id] = parts[2]
+    return states
+
+
+def finished_job_events(job_ids):
+    """Final state of finished jobs from a single `sacct` call, as event dicts, or None if sacct failed.
+
+    An array job is COMPLETED only if all of its tasks are; otherwise it
+    takes the state of its first task that did not complete, or of a task
+    still active.
+    """
+    returncode, output, stderr = get_backend().run(
+        f"sacct -X -n -P -j {','.join(job_ids)} -o JobID,JobName,State,ExitCode,Elapsed")
+    if returncode != 0:
+        print(f"Error running sacct: {stderr.strip() or f'exit status {returncode}'}, polling again later")
+        return None
+    events = {job_id: {'job_id': job_id, 'name': None, 'state': 'UNKNOWN', 'exit_code': None, 'elapsed': None}
+              for job_id in job_ids}
+    for line in output.split('\n'):
+        parts = line.split('|')
+        if len(parts) < 5:
+            continue
+        job_id = parts[0].split('_', 1)[0]
+        if job_id not in events:
+            continue
+        event = events[job_id]
+        state = parts[2].split(' ', 1)[0]
+        if event['state'] in ('UNKNOWN', 'COMPLETED') or (
+                state in ACTIVE_JOB_STATES and event['state'] not in ACTIVE_JOB_STATES):
+            event.update(name=parts[1], state=state, exit_code=parts[3], elapsed=parts[4])
+    return list(events.values())
+
+
+def expand_hook(template, event):
+    for key in WAIT_EVENT_FIELDS:
+        template = template.replace('{' + key + '}', str(event[key] or ''))
+    return template
+
+
+def run_wait_hooks(event, args):
+    """Fire the hooks configured on the command line for a finished job."""
+    message = f"Job {event['job_id']} ({event['name'] or '-'}) finished: {event['state']}"
+    if args.exec:
+        env = dict(os.environ, **{f'LABSYNC_JOB_{key.upper()}': str(event[key] or '')
+                                  for key in WAIT_EVENT_FIELDS})
+        subprocess.run(expand_hook(args.exec, event), shell=True, env=env)
+    if args.notify:
+        if shutil.which('notify-send'):
+            subprocess.run(['notify-send', 'LabSync', message])
+        else:
+            sys.stdout.write('\a')
+            sys.stdout.flush()
+    if args.email:
+        if shutil.which('mail'):
+            subprocess.run(['mail', '-s', message, args.email], input=message + '\n', text=True)
+        else:
+            print("Cannot send email: `mail` is not installed")
+    if args.upload:
+        path = expand_hook(args.upload, event)
+        if os.path.exists(path):
+            subprocess.run([sys.executable, '-m', 'labsync.main', 'gd', path])
+        else:
+            print(f"Not uploading {path}: no such file or directory")
 
 
-def cluster_submit(args):
-    os.makedirs('slurm', exist_ok=True)
+def cluster_wait(args):
+    pending = list(dict.fromkeys(args.job_ids))
+    last_states = {}
+    interval = args.interval
+    try:
+        while pending:
+            states = poll_job_states(pending)
+            if states is None:
+                time.sleep(interval)
+                continue
+            finished = [job_id for job_id in pending if job_id not in states]
+            changed = bool(finished) or any(last_states.get(job_id) != state for job_id, state in states.items())
+            last_states = states
+
+            events = finished_job_events(finished) if finished else []
+            if events is None:
+                finished = []
+            else:
+                # Jobs gone from squeue that sacct still reports active are polled again
+                events = [event for event in events if event['state'] not in ACTIVE_JOB_STATES]
+                finished = [event['job_id'] for event in events]
+            if finished:
+                if args.format != 'table':
+                    write_rows(events, WAIT_EVENT_FIELDS, args.format)
+                for event in events:
+                    if args.format == 'table':
+                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Job {event['job_id']} "
+                              f"({event['name'] or '-'}) finished: {event['state']}, "
+                              f"exit code {event['exit_code'] or '-'}, elapsed {event['elapsed'] or '-'}")
+                    run_wait_hooks(event, args)
+                pending = [job_id for job_id in pending if job_id not in finished]
+            if not pending:
+                break
+
+            # Poll less often while nothing changes
+            interval = args.interval if changed else min(interval * WAIT_BACKOFF, args.max_interval)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def start_background_wait(job_id, args):
+    """Start a detached `lab cluster wait` that notifies when `job_id` finishes."""
+    log_file = f'slurm/wait-{job_id}.log'
+    with open(log_file, 'a') as log:
+        subprocess.Popen([sys.executable, '-m', 'labsync.main', 'cluster', 'wait', job_id, '--notify'],
+                         stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                         start_new_session=True)
+    print(f"Waiting for job {job_id} in the background, log in {log_file}")
+
+
+EFFICIENCY_FIELDS = ['job_id', 'name', 'state', 'elapsed', 'cpus', 'cpus_used', 'cpu_efficiency',
+                     'mem_mb', 'max_rss_mb', 'mem_efficiency', 'gpus', 'gpu_util', 'gpu_mem_mb']
+
+# Job name of `sbatch --wrap` jobs submitted without --job-name
+DEFAULT_JOB_NAME = 'wrap'
+DEFAULT_CPUS = 12
+DEFAULT_MEM = '128G'
+
+
+def iter_efficiency_rows(jobs):
+    for job in jobs:
+        yield {
+            'job_id': job.job_id,
+            'name': job.name,
+            'state': job.state,
+            'elapsed': job.elapsed,
+            'cpus': job.cpus,
+            'cpus_used': round(job.cpus_used, 2),
+            'cpu_efficiency': round(job.cpu_efficiency, 3) if job.cpu_efficiency is not None else None,
+            'mem_mb': job.mem_mb,
+            'max_rss_mb': job.max_rss_mb,
+            'mem_efficiency': round(job.mem_efficiency, 3) if job.mem_efficiency is not None else None,
+            'gpus': job.gpus,
+            'gpu_util': job.gpu_util,
+            'gpu_mem_mb': job.gpu_mem_mb,
+        }
+
+
+def format_percent(value):
+    return f"{100 * value:.0f}%" if value is not None else "-"
+
+
+def cluster_efficiency(args):
+    username = args.user or os.getenv('USER', 'unknown')
+    since = (datetime.now() - timedelta(days=args.days)).strftime('%Y-%m-%dT%H:%M:%S')
+    # Allocation and step lines of all finished jobs in one query
+    output = run_command(f"sacct -n -P -u {shlex.quote(username)} -S {since} -s CD,F,TO,OOM,CA "
+                         f"-o {EFFICIENCY_SACCT_FIELDS}")
+    jobs = [job for job in parse_sacct_efficiency(output) if job.elapsed > 0]
+    if args.name:
+        jobs = [job for job in jobs if fnmatch.fnmatch(job.name, args.name)]
+
+    if args.format != 'table':
+        write_rows(iter_efficiency_rows(jobs), EFFICIENCY_FIELDS, args.format)
+        return
+    if not jobs:
+        print(f"No finished jobs of {username} in the last {args.days:g} days")
+        return
 
-    command_str = ' '.join(args.command)
+    print(f"{'Job ID':<12} {'Job Name':<20} {'State':<11} {'Elapsed':>8} {'CPUs':>5} {'Used':>6} {'CPU Eff':>8} "
+          f"{'Mem Req':>8} {'Max RSS':>8} {'Mem Eff':>8} {'GPUs':>5} {'GPU Util':>9}")
+    print("-" * 120)
+    for job in jobs:
+        gpu_util = f"{job.gpu_util}%" if job.gpu_util is not None else "-"
+        print(f"{job.job_id:<12} {job.name[:19]:<20} {job.state[:10]:<11} {format_duration(job.elapsed):>8} "
+              f"{job.cpus:>5} {job.cpus_used:>6.1f} {format_percent(job.cpu_efficiency):>8} "
+              f"{job.mem_mb / 1024:>7.1f}G {job.max_rss_mb / 1024:>7.1f}G {format_percent(job.mem_efficiency):>8} "
+              f"{job.gpus:>5} {gpu_util:>9}")
+    print("-" * 120)
+
+    cpu_time = sum(job.cpu_time for job in jobs)
+    cpu_alloc = sum(job.elapsed * job.cpus for job in jobs)
+    mem_used = sum(job.elapsed * job.max_rss_mb for job in jobs)
+    mem_alloc = sum(job.elapsed * job.mem_mb for job in jobs)
+    print(f"Overall CPU efficiency: {format_percent(cpu_time / cpu_alloc if cpu_alloc else None)}, "
+          f"memory efficiency: {format_percent(mem_used / mem_alloc if mem_alloc else None)} "
+          f"(weighted by run time, {len(jobs)} jobs)")
+
+    by_name = defaultdict(list)
+    for job in jobs:
+        by_name[job.name].append(job)
+    suggestions = {name: suggest_resources(name_jobs) for name, name_jobs in by_name.items()}
+    print("")
+    print("Suggested requests (peak usage plus 25%):")
+    for name, suggestion in suggestions.items():
+        if suggestion is None:
+            print(f"  {name[:30]:<31} no usage accounting (MaxRSS/TotalCPU)  ({len(by_name[name])} jobs)")
+        else:
+            print(f"  {name[:30]:<31} --cpus {suggestion['cpus']} --mem {suggestion['mem']}  ({len(by_name[name])} jobs)")
+    suggestions = {name: suggestion for name, suggestion in suggestions.items() if suggestion is not None}
+
+    if args.save and not suggestions:
+        print("Nothing to save")
+    elif args.save:
+        config = load_config()
+        submit_defaults = config.setdefault('submit_defaults', {})
+        submit_defaults.update(suggestions)
+        save_config(config)
+        print(f"Saved as defaults of `lab cluster submit` for jobs with these names "
+              f"(`{DEFAULT_JOB_NAME}` is used without --job-name)")
+
+
+def apply_submit_defaults(args):
+    """Fill in --cpus/--mem not given on the command line from saved defaults."""
+    name = args.job_name or DEFAULT_JOB_NAME
+    defaults = load_config().get('submit_defaults', {}).get(name, {})
+    if defaults and (args.cpus is None or args.mem is None):
+        print(f"Using saved defaults for job name '{name}': "
+              f"--cpus {defaults['cpus']} --mem {defaults['mem']}")
+    if args.cpus is None:
+        args.cpus = defaults.get('cpus', DEFAULT_CPUS)
+    if args.mem is None:
+        args.mem = defaults.get('mem', DEFAULT_MEM)
+
+
+STATS_FIELDS = ['key', 'gpu_hours', 'jobs', 'share']
+
+
+def cluster_stats(args):
+    store = UsageStore()
+    since = time.time() - args.days * 86400
+    if not args.no_update:
+        def fetch(start, end):
+            cmd = f"sacct -a -X -n -P -S {format_sacct_time(start)} -E {format_sacct_time(end)} -o {SACCT_FIELDS}"
+            returncode, stdout, stderr = get_backend().run(cmd)
+            if returncode != 0:
+                print(f"Error running command '{cmd}': {stderr.strip() or f'exit status {returncode}'}")
+                return None
+            return stdout
+        store.update(fetch, since)
+    rows = store.gpu_hours(args.by, since, user=args.user)
+    store.close()
+
+    total = sum(hours for _, hours, _ in rows)
+    rows = [{'key': key or '-', 'gpu_hours': round(hours, 1), 'jobs': jobs,
+             'share': round(100 * hours / total, 1) if total else 0.0}
+            for key, hours, jobs in rows]
+    if args.format != 'table':
+        write_rows(rows, STATS_FIELDS, args.format)
+        return
 
-    resources = f"--cpus-per-task={args.cpus} --gres=gpu:{args.gpus} --mem={args.mem}"
+    title = {'user': 'User', 'partition': 'Partition', 'type': 'GPU Type', 'day': 'Day'}[args.by]
+    print(f"GPU hours over the last {args.days:g} days" + (f" for {args.user}" if args.user else ""))
+    print(f"{title:<20} {'GPU Hours':>12} {'Jobs':>8} {'Share':>7}")
+    print("-" * 50)
+    for row in rows:
+        print(f"{row['key'][:19]:<20} {row['gpu_hours']:>12.1f} {row['jobs']:>8} {row['share']:>6.1f}%")
+    print("-" * 50)
+    print(f"{'Total':<20} {total:>12.1f}")
+
+
+def cluster_daemon(args):
+    serve(ClusterSnapshot(use_daemon=False), args.socket, args.interval)
 
-    slurm_cmd = (f"sbatch -p {args.partition} {resources} "
-                 f"--output=slurm/slurm-%j.out --error=slurm/slurm-%j.out ")
+
+def sbatch_options(args):
+    """Partition, resource, account and dependency options of `sbatch`."""
+    gres = f"gpu:{args.gpu_type}:{args.gpus}" if args.gpu_type else f"gpu:{args.gpus}"
+    resources = f"--cpus-per-task={args.cpus} --gres={gres} --mem={args.mem}"
+
+    options = f"-p {args.partition} {resources} "
+
+    if args.job_name:
+        options += f"--job-name={shlex.quote(args.job_name)} "
+
+    if args.nodelist:
+        options += f"--nodelist={args.nodelist} "
 
     if args.account:
-        slurm_cmd += f"--account {args.account} "
+        options += f"--account {args.account} "
 
     if args.dependency:
-        slurm_cmd += f"--dependency=afterok:{args.dependency} "
+        options += f"--dependency=afterok:{args.dependency} "
+
+    return options
+
 
-    slurm_cmd += f"--wrap '"
+def environment_setup(args):
+    """Shell commands to run before the job command."""
+    setup = ""
 
     if args.conda:
-        slurm_cmd += f"source ~/miniconda3/etc/profile.d/conda.sh; conda activate {args.conda}; "
+        setup += f"source ~/miniconda3/etc/profile.d/conda.sh; conda activate {args.conda}; "
 
     if args.path:
-        slurm_cmd += f"export PATH={args.path}:$PATH; "
+        setup += f"export PATH={args.path}:$PATH; "
 
-    slurm_cmd += f"{command_str}'"
+    return setup
 
+
+def run_sbatch(slurm_cmd):
     print(f"Submitting SLURM job: {slurm_cmd}")
 
-    result = subprocess.run(slurm_cmd, shell=True, capture_output=True, text=True)
-    if result.returncode == 0:
-        job_id = result.stdout.strip().split()[-1]
+    returncode, stdout, stderr = get_backend().run(slurm_cmd)
+    if returncode == 0:
+        job_id = stdout.strip().split()[-1]
         print(f"Submitted job {job_id}")
         return job_id
     else:
-        print(f"Error submitting job: {result.stderr}")
+        print(f"Error submitting job: {stderr}")
         return None
 
 
+def pending_gpu_demand(snapshot):
+    """Total GPUs requested by pending jobs, per partition."""
+    demand = defaultdict(int)
+    for job_info in snapshot.gpu_jobs.values():
+        if job_info['state'] != 'PENDING':
+            continue
+        # A job pending on several partitions counts against each of them
+        for partition in job_info['partition'].split(','):
+            demand[partition] += job_info['gpu_count']
+    return demand
+
+
+def rank_placements(snapshot, gpus, gpu_type=None):
+    """Rank (partition, node) placements for a job needing `gpus` GPUs.
+
+    Placements are ordered by whether pending jobs would likely claim the
+    free GPUs first (projected queue wait), then by how few GPUs are left
+    idle on the node (best fit, to limit fragmentation), then by pending
+    demand and free capacity of the partition.
+    """
+    free_gpus = defaultdict(int)
+    for row in iter_gpu_rows(snapshot):
+        if gpu_type and row['type'].lower() != gpu_type.lower():
+            continue
+        if row['status'] == 'AVAILABLE':
+            free_gpus[row['node']] += 1
+
+    node_partitions = {
+        node: list(dict.fromkeys(p.rstrip('*') for p in snapshot.node_partitions.get_all(node)))
+        for node in free_gpus
+    }
+    partition_free = defaultdict(int)
+    for node, partitions in node_partitions.items():
+        for partition in partitions:
+            partition_free[partition] += free_gpus[node]
+    demand = pending_gpu_demand(snapshot)
+
+    placements = []
+    for node, free in free_gpus.items():
+        if free < gpus:
+            continue
+        for partition in node_partitions[node]:
+            placements.append({
+                'partition': partition,
+                'node': node,
+                'free_gpus': free,
+                'partition_free_gpus': partition_free[partition],
+                'pending_gpus': demand[partition],
+                'queued_ahead': demand[partition] > partition_free[partition] - gpus,
+            })
+    placements.sort(key=lambda p: (p['queued_ahead'], p['free_gpus'] - gpus,
+                                   p['pending_gpus'], -p['partition_free_gpus'],
+                                   p['partition'], p['node']))
+    return placements
+
+
+def choose_placement(args):
+    """Fill in `args.partition` (and `args.nodelist`) from current free capacity."""
+    placements = rank_placements(ClusterSnapshot(), args.gpus, args.gpu_type)
+    gpu_desc = f"{args.gpus} free {args.gpu_type + ' ' if args.gpu_type else ''}GPU(s)"
+    if not placements:
+        print(f"No node currently has {gpu_desc}")
+        return False
+
+    print(f"{'Partition':<15} {'Node':<12} {'Free':<6} {'Partition free':<16} {'Pending GPUs':<12}")
+    for placement in placements[:5]:
+        print(f"{placement['partition']:<15} {placement['node']:<12} {placement['free_gpus']:<6} "
+              f"{placement['partition_free_gpus']:<16} {placement['pending_gpus']:<12}")
+
+    best = placements[0]
+    args.partition = best['partition']
+    # Array tasks should spread over the partition rather than share one node
+    if not (args.sweep or args.array_from):
+        args.nodelist = best['node']
+    print(f"Selected partition {args.partition}" + (f", node {args.nodelist}" if args.nodelist else ""))
+    return True
+
+
+def cluster_submit(args):
+    apply_submit_defaults(args)
+    if args.auto:
+        if not choose_placement(args):
+            return None
+    elif not args.partition:
+        print("Specify a partition or use --auto")
+        return None
+
+    if args.sweep or args.array_from:
+        return cluster_submit_array(args)
+
+    os.makedirs('slurm', exist_ok=True)
+
+    command_str = ' '.join(args.command)
+
+    slurm_cmd = (f"sbatch {sbatch_options(args)}"
+                 f"--output=slurm/slurm-%j.out --error=slurm/slurm-%j.out ")
+
+    slurm_cmd += f"--wrap '{environment_setup(args)}{command_str}'"
+
+    job_id = run_sbatch(slurm_cmd)
+    if job_id and args.notify:
+        start_background_wait(job_id, args)
+    return job_id
+
+
+def load_sweep_commands(args):
+    """Expand `--array-from` or `--sweep` into the list of per-task commands.
+
+    A sweep file (YAML or JSON) has a `command` template, which defaults to
+    the command given on the command line, and `parameters` mapping each
+    placeholder to a list of values. Every combination becomes one task.
+    Only `{name}` placeholders of the parameters are substituted, so other
+    braces in the command (e.g. JSON arguments) are kept as they are.
+    """
+    if args.array_from:
+        with open(args.array_from) as f:
+            return [line.strip() for line in f
+                    if line.strip() and not line.strip().startswith('#')]
+
+    with open(args.sweep) as f:
+        if args.sweep.endswith('.json'):
+            spec = json.load(f)
+        else:
+            import yaml
+            spec = yaml.safe_load(f)
+
+    template = spec.get('command') or ' '.join(args.command)
+    if not template:
+        raise ValueError(f'No command template in {args.sweep} or on the command line')
+    parameters = spec.get('parameters') or {}
+    names = list(parameters)
+    values = [v if isinstance(v, list) else [v] for v in parameters.values()]
+    if not names:
+        return [template]
+    placeholder = re.compile('{(' + '|'.join(re.escape(str(name)) for name in names) + ')}')
+    return [placeholder.sub(lambda match: str(dict(zip(names, combo))[match.group(1)]), template)
+            for combo in itertools.product(*values)]
+
+
+def cluster_submit_array(args):
+    """Submit a sweep as a single SLURM job array with a per-task command table."""
+    commands = load_sweep_commands(args)
+    if not commands:
+        print("No commands to submit")
+        return None
+
+    os.makedirs('slurm', exist_ok=True)
+    # Unique names, so that sweeps submitted within the same second do not share a table
+    fd, table_file = tempfile.mkstemp(dir='slurm', prefix=f"sweep-{datetime.now().strftime('%Y%m%d-%H%M%S')}-",
+                                      suffix='.cmds')
+    table_file = os.path.abspath(table_file)
+    script_file = os.path.relpath(table_file[:-len('.cmds')] + '.sh')
+
+    with os.fdopen(fd, 'w') as f:
+        for command in commands:
+            f.write(command.replace('\n', ' ') + '\n')
+
+    with open(script_file, 'w') as f:
+        f.write('#!/bin/bash\n')
+        setup = environment_setup(args)
+        if setup:
+            f.write(setup + '\n')
+        f.write(f'eval "$(sed -n "$((SLURM_ARRAY_TASK_ID + 1))p" {shlex.quote(table_file)})"\n')
+
+    array = f"0-{len(commands) - 1}"
+    if args.throttle:
+        array += f"%{args.throttle}"
+
+    print(f"Sweep of {len(commands)} tasks, commands in {table_file}")
+    slurm_cmd = (f"sbatch --array={array} {sbatch_options(args)}"
+                 f"--output=slurm/slurm-%A_%a.out --error=slurm/slurm-%A_%a.out {script_file}")
+    job_id = run_sbatch(slurm_cmd)
+    if job_id and args.notify:
+        start_background_wait(job_id, args)
+    return job_id
+
+
 def get_parser():
     parser = argparse.ArgumentParser(
         prog='labsync cluster',
@@ -504,15 +1597,96 @@ def get_parser():
     subparsers = parser.add_subparsers(dest='subcommand', help='Cluster shortcuts')
 
     ls_parser = subparsers.add_parser('ls', help='List GPU status in the cluster')
+    ls_parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                           help=f'Maximum concurrent per-job SLURM queries (default: {DEFAULT_MAX_CONCURRENCY})')
+    ls_parser.add_argument('--cache-ttl', type=int, default=DEFAULT_TOPOLOGY_TTL,
+                           help=f'Seconds to cache node and partition topology, 0 to disable (default: {DEFAULT_TOPOLOGY_TTL})')
+    ls_parser.add_argument('--refresh', action='store_true',
+                           help='Re-query cached node and partition topology')
+    ls_parser.add_argument('--format', choices=OUTPUT_FORMATS, default='table',
+                           help='Output format (default: table)')
+    ls_parser.add_argument('--no-daemon', action='store_true',
+                           help='Query SLURM directly even if a cluster daemon is running')
+    ls_parser.add_argument('--watch', type=float, nargs='?', const=5, default=None, metavar='SECONDS',
+                           help='Keep refreshing the report every SECONDS (default: 5)')
+    ls_parser.add_argument('--util', action='store_true',
+                           help='Show live GPU utilization and memory of every GPU')
+    ls_parser.add_argument('--util-cmd', type=str, default=DEFAULT_UTIL_CMD,
+                           help='Per-node command printing nvidia-smi style CSV; {node} is replaced by the node name '
+                                '(default: ssh + nvidia-smi, or $LABSYNC_UTIL_CMD)')
+    ls_parser.add_argument('--util-timeout', type=float, default=DEFAULT_UTIL_TIMEOUT,
+                           help=f'Seconds to wait for each node (default: {DEFAULT_UTIL_TIMEOUT})')
+    ls_parser.add_argument('--util-concurrency', type=int, default=DEFAULT_UTIL_CONCURRENCY,
+                           help=f'Maximum nodes queried at once for --util (default: {DEFAULT_UTIL_CONCURRENCY})')
     jobs_parser = subparsers.add_parser('jobs', help='List slurm jobs for current user')
+    jobs_parser.add_argument('--format', choices=OUTPUT_FORMATS, default='table',
+                             help='Output format (default: table)')
+    jobs_parser.add_argument('--no-daemon', action='store_true',
+                             help='Query SLURM directly even if a cluster daemon is running')
+    jobs_parser.add_argument('--follow', action='store_true',
+                             help='Stream the output logs of all running jobs, prefixed by job ID')
+    jobs_parser.add_argument('--log-dir', type=str, default='slurm',
+                             help='Directory of the slurm-<job ID>.out logs (default: slurm)')
+    jobs_parser.add_argument('--lines', type=int, default=10,
+                             help='Existing lines to show from each log with --follow (default: 10)')
     kill_parser = subparsers.add_parser('kill', help='Kill slurm jobs by ID range')
-    kill_parser.add_argument('start_job_id', type=int, help='Start job ID')
-    kill_parser.add_argument('end_job_id', type=int, help='End job ID')
+    kill_parser.add_argument('start_job_id', type=int, nargs='?', help='Start job ID')
+    kill_parser.add_argument('end_job_id', type=int, nargs='?', help='End job ID (default: start job ID)')
+    kill_parser.add_argument('--name', type=str, help='Only jobs whose name matches this glob')
+    kill_parser.add_argument('--state', type=str, help='Only jobs in these states, e.g. PENDING,RUNNING')
+    kill_parser.add_argument('--partition', type=str, help='Only jobs in this partition')
+    kill_parser.add_argument('--dry-run', action='store_true', help='List matching jobs without cancelling them')
     bash_parser = subparsers.add_parser('bash', help='Connect to a job with bash')
-    bash_parser.add_argument('job_id', type=int, help='Job ID to connect to')
+    bash_parser.add_argument('job_id', type=str, nargs='?',
+                             help='Job ID to connect to (default: your most recently started running job)')
+    bash_parser.add_argument('--node', type=str, help='Node of a multi-node job to connect to')
+    bash_parser.add_argument('--overlap', action='store_true',
+                             help='Share the resources of the running job step instead of waiting for free ones')
 
     subparsers.add_parser('submit', help='Submit a SLURM job')
 
+    daemon_parser = subparsers.add_parser('daemon', help='Poll SLURM and serve snapshots to lab ls/jobs on this host')
+    daemon_parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                               help=f'Seconds between SLURM polls (default: {DEFAULT_INTERVAL})')
+    daemon_parser.add_argument('--socket', type=str, default=DEFAULT_SOCKET,
+                               help=f'Unix socket to serve on (default: {DEFAULT_SOCKET})')
+
+    wait_parser = subparsers.add_parser('wait', help='Wait for jobs to finish and run hooks')
+    wait_parser.add_argument('job_ids', type=str, nargs='+', help='Job IDs to wait for')
+    wait_parser.add_argument('--interval', type=float, default=WAIT_INTERVAL,
+                             help=f'Seconds between polls, growing while nothing changes (default: {WAIT_INTERVAL})')
+    wait_parser.add_argument('--max-interval', type=float, default=WAIT_MAX_INTERVAL,
+                             help=f'Longest time between polls (default: {WAIT_MAX_INTERVAL})')
+    wait_parser.add_argument('--exec', type=str,
+                             help='Shell command to run for each finished job; {job_id}, {name}, {state}, '
+                                  '{exit_code} and {elapsed} are replaced, and set as LABSYNC_JOB_* variables')
+    wait_parser.add_argument('--notify', action='store_true',
+                             help='Send a desktop notification (or ring the terminal bell) for each finished job')
+    wait_parser.add_argument('--email', type=str, help='Email this address for each finished job (needs `mail`)')
+    wait_parser.add_argument('--upload', type=str, metavar='PATH',
+                             help='Upload PATH to Google Drive for each finished job, e.g. slurm/slurm-{job_id}.out')
+    wait_parser.add_argument('--format', choices=['table', 'ndjson'], default='table',
+                             help='Output format of job events (default: table)')
+
+    efficiency_parser = subparsers.add_parser('efficiency', help='Compare requested and used resources of finished jobs')
+    efficiency_parser.add_argument('--days', type=float, default=7, help='Days of history to read (default: 7)')
+    efficiency_parser.add_argument('--user', type=str, help='User whose jobs to report (default: you)')
+    efficiency_parser.add_argument('--name', type=str, help='Only jobs whose name matches this glob')
+    efficiency_parser.add_argument('--save', action='store_true',
+                                   help='Save the suggested --cpus/--mem per job name as defaults of `lab cluster submit`')
+    efficiency_parser.add_argument('--format', choices=OUTPUT_FORMATS, default='table',
+                                   help='Output format (default: table)')
+
+    stats_parser = subparsers.add_parser('stats', help='GPU hours by user, partition, GPU type or day')
+    stats_parser.add_argument('--days', type=float, default=30, help='Days of history to report (default: 30)')
+    stats_parser.add_argument('--by', choices=['user', 'partition', 'type', 'day'], default='user',
+                              help='How to group GPU hours (default: user)')
+    stats_parser.add_argument('--user', type=str, help='Only jobs of this user')
+    stats_parser.add_argument('--format', choices=OUTPUT_FORMATS, default='table',
+                              help='Output format (default: table)')
+    stats_parser.add_argument('--no-update', action='store_true',
+                              help='Report from the local store without querying sacct for new jobs')
+
     return parser
 
 
@@ -524,16 +1698,35 @@ def cluster():
             prog='labsync cluster submit',
             description='Submit a SLURM job with specified resources'
         )
-        submit_parser.add_argument('partition', type=str, help='SLURM partition to submit to')
+        submit_parser.add_argument('partition', type=str, nargs='?', help='SLURM partition to submit to')
         submit_parser.add_argument('--gpus', type=int, default=1, help='Number of GPUs to request (default: 1)')
-        submit_parser.add_argument('--cpus', type=int, default=12, help='Number of CPUs per task (default: 12)')
-        submit_parser.add_argument('--mem', type=str, default='128G', help='Memory to request (default: 128G)')
+        submit_parser.add_argument('--cpus', type=int,
+                                   help=f'Number of CPUs per task (default: saved by `lab cluster efficiency --save`, '
+                                        f'else {DEFAULT_CPUS})')
+        submit_parser.add_argument('--mem', type=str,
+                                   help=f'Memory to request (default: saved by `lab cluster efficiency --save`, '
+                                        f'else {DEFAULT_MEM})')
+        submit_parser.add_argument('--job-name', type=str, help='Job name, also selecting saved --cpus/--mem defaults')
         submit_parser.add_argument('--conda', type=str, help='Conda environment to activate')
         submit_parser.add_argument('--path', type=str, help='Prepend to PATH environment variable')
         submit_parser.add_argument('--account', type=str, help='SLURM account to use')
         submit_parser.add_argument('--dependency', type=str, help='Job ID dependency (afterok)')
+        submit_parser.add_argument('--sweep', type=str, help='YAML/JSON sweep file; submits one job array over all parameter combinations')
+        submit_parser.add_argument('--array-from', type=str, help='File with one command per line; submits one job array')
+        submit_parser.add_argument('--auto', action='store_true', help='Pick the partition and node with free GPUs')
+        submit_parser.add_argument('--gpu-type', type=str, help='GPU type to request, e.g. a100; also used by --auto to choose a placement')
+        submit_parser.add_argument('--nodelist', type=str, help='Nodes to run on')
+        submit_parser.add_argument('--notify', action='store_true',
+                                   help='Notify when the job finishes, from a background `lab cluster wait`')
+        submit_parser.add_argument('--throttle', type=int, help='Maximum number of array tasks running at once (%%N)')
 
         args, command = submit_parser.parse_known_args(sys.argv[3:])
+        if args.auto and args.partition:
+            # With --auto the optional partition slot swallows the first command word
+            command = [args.partition] + command
+            args.partition = None
+        if command and command[0] == '--':
+            command = command[1:]
         args.command = command
         cluster_submit(args)
     else:
@@ -546,5 +1739,13 @@ def cluster():
             cluster_kill(args)
         elif args.subcommand == 'bash':
             cluster_bash(args)
+        elif args.subcommand == 'daemon':
+            cluster_daemon(args)
+        elif args.subcommand == 'wait':
+            cluster_wait(args)
+        elif args.subcommand == 'efficiency':
+            cluster_efficiency(args)
+        elif args.subcommand == 'stats':
+            cluster_stats(args)
         else:
             parser.print_help()
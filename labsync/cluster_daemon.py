@@ -0,0 +1,116 @@
+"""Per-host daemon that polls SLURM once and serves the snapshot to `lab` clients.
+
+The daemon publishes the parsed cluster snapshot as JSON over a Unix socket.
+`lab ls` and `lab jobs` read it instead of querying SLURM themselves, so the
+load on slurmctld no longer grows with the number of users on a login node.
+
+Clients only trust a socket owned by themselves or by a uid listed in the
+LABSYNC_DAEMON_UID environment variable (e.g. the account running a shared
+daemon), so that another user cannot serve forged snapshots on the path.
+"""
+import os
+import json
+import socket
+import socketserver
+import stat
+import threading
+import time
+
+DEFAULT_SOCKET = os.environ.get('LABSYNC_DAEMON_SOCKET', '/tmp/labsync-cluster.sock')
+DEFAULT_INTERVAL = 30
+TRUSTED_UIDS = {int(uid) for uid in os.environ.get('LABSYNC_DAEMON_UID', '').split(',') if uid.strip().isdigit()}
+
+# A snapshot older than this many polling intervals is treated as stale.
+STALE_INTERVALS = 3
+
+
+def socket_owner_trusted(socket_path):
+    """Whether `socket_path` is a socket owned by the current user or a trusted uid."""
+    try:
+        st = os.lstat(socket_path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and (st.st_uid == os.getuid() or st.st_uid in TRUSTED_UIDS)
+
+
+def read_snapshot(socket_path=DEFAULT_SOCKET, timeout=2):
+    """Return the snapshot payload of a running daemon, or None if unavailable or untrusted."""
+    if not socket_owner_trusted(socket_path):
+        return None
+    chunks = []
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            while True:
+                chunk = sock.recv(1 << 20)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        payload = json.loads(b''.join(chunks))
+    except (OSError, ValueError):
+        return None
+    if time.time() - payload.get('time', 0) > STALE_INTERVALS * payload.get('interval', DEFAULT_INTERVAL):
+        return None
+    return payload
+
+
+class _SnapshotHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # Without a payload the connection is closed empty and clients query SLURM themselves
+        if self.server.payload is not None:
+            self.request.sendall(self.server.payload)
+
+
+def _encode(snapshot, interval):
+    payload = snapshot.to_payload()
+    if payload is None:
+        return None
+    payload['time'] = time.time()
+    payload['interval'] = interval
+    return json.dumps(payload).encode()
+
+
+def serve(snapshot, socket_path=DEFAULT_SOCKET, interval=DEFAULT_INTERVAL):
+    """Poll `snapshot` every `interval` seconds and serve it on `socket_path`.
+
+    A refresh during which a SLURM query failed is not published.
+    """
+    if os.path.lexists(socket_path):
+        if read_snapshot(socket_path) is not None:
+            print(f'A daemon is already serving {socket_path}')
+            return
+        try:
+            os.remove(socket_path)
+        except OSError as e:
+            print(f'Error: cannot remove {socket_path} ({e.strerror}), it may belong to another user; '
+                  f'use --socket or LABSYNC_DAEMON_SOCKET to serve on another path')
+            return
+
+    payload = _encode(snapshot, interval)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, _SnapshotHandler)
+    server.daemon_threads = True
+    server.payload = payload
+    # Clients of every user on this host may read the snapshot
+    os.chmod(socket_path, 0o666)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f'Serving cluster snapshot on {socket_path} (polling every {interval}s)')
+    try:
+        while True:
+            time.sleep(interval)
+            snapshot.refresh_live()
+            payload = _encode(snapshot, interval)
+            if payload is None:
+                # Keep serving the last good snapshot; clients fall back to SLURM once it is stale
+                print(f"[{time.strftime('%H:%M:%S')}] SLURM query failed, snapshot not updated")
+                continue
+            server.payload = payload
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
@@ -0,0 +1,120 @@
+"""Requested vs. used resources of finished jobs, from one bulk `sacct` query.
+
+Allocation lines of `sacct` carry the requested TRES, elapsed time and total
+CPU time; the peak memory (MaxRSS) and, on recent SLURM versions, GPU usage
+(TRESUsageInMax) are reported on the job steps and folded into their job.
+"""
+import math
+from .slurm_parser import Tres, parse_mem_mb
+
+SACCT_FIELDS = 'JobID,JobName,State,ElapsedRaw,TotalCPU,AllocTRES,MaxRSS,TRESUsageInMax'
+
+# Headroom added on top of the peak usage when suggesting requests.
+HEADROOM = 1.25
+# Suggestions never go below these requests.
+MIN_CPUS = 2
+MIN_MEM_MB = 4 * 1024
+
+
+def parse_cpu_time(value):
+    """Seconds of a SLURM CPU time such as `1-02:03:04`, `02:03:04` or `03:04.567`."""
+    if not value:
+        return 0.0
+    days = 0
+    if '-' in value:
+        days, value = value.split('-', 1)
+        days = int(days)
+    seconds = 0.0
+    for part in value.split(':'):
+        seconds = seconds * 60 + float(part or 0)
+    return days * 86400 + seconds
+
+
+def _tres_usage(value):
+    usage = {}
+    for item in (value or '').split(','):
+        key, _, amount = item.partition('=')
+        if key:
+            usage[key] = amount
+    return usage
+
+
+class JobUsage:
+    """Requested and used resources of one job."""
+    __slots__ = ('job_id', 'name', 'state', 'elapsed', 'cpu_time', 'cpus', 'mem_mb',
+                 'gpus', 'max_rss_mb', 'gpu_util', 'gpu_mem_mb')
+
+    def __init__(self, job_id, name, state, elapsed, cpu_time, tres):
+        self.job_id = job_id
+        self.name = name
+        self.state = state
+        self.elapsed = elapsed
+        self.cpu_time = cpu_time
+        self.cpus = tres.cpus
+        self.mem_mb = tres.mem_mb
+        self.gpus = tres.gpus
+        self.max_rss_mb = 0
+        self.gpu_util = None
+        self.gpu_mem_mb = None
+
+    @property
+    def cpu_efficiency(self):
+        if not self.elapsed or not self.cpus:
+            return None
+        return self.cpu_time / (self.elapsed * self.cpus)
+
+    @property
+    def mem_efficiency(self):
+        if not self.mem_mb:
+            return None
+        return self.max_rss_mb / self.mem_mb
+
+    @property
+    def cpus_used(self):
+        """Average number of busy CPUs over the job's run time."""
+        return self.cpu_time / self.elapsed if self.elapsed else 0.0
+
+
+def parse_sacct_efficiency(output):
+    """Parse `sacct -P -o SACCT_FIELDS` output into [JobUsage], steps folded into their jobs."""
+    jobs = {}
+    for line in output.split('\n'):
+        parts = line.split('|')
+        if len(parts) < 8:
+            continue
+        job_id, name, state, elapsed, cpu_time, alloc_tres, max_rss, usage_max = parts[:8]
+        parent_id = job_id.split('.', 1)[0]
+        if job_id == parent_id:
+            jobs[job_id] = JobUsage(job_id, name, state.split(' ', 1)[0],
+                                    int(elapsed) if elapsed.isdigit() else 0,
+                                    parse_cpu_time(cpu_time), Tres.parse(alloc_tres))
+            continue
+        job = jobs.get(parent_id)
+        if job is None:
+            continue
+        job.max_rss_mb = max(job.max_rss_mb, parse_mem_mb(max_rss))
+        usage = _tres_usage(usage_max)
+        if 'gres/gpuutil' in usage and usage['gres/gpuutil'].isdigit():
+            job.gpu_util = max(job.gpu_util or 0, int(usage['gres/gpuutil']))
+        if 'gres/gpumem' in usage:
+            job.gpu_mem_mb = max(job.gpu_mem_mb or 0, parse_mem_mb(usage['gres/gpumem']))
+    return list(jobs.values())
+
+
+def format_mem(mem_mb):
+    """Memory in the `--mem` form, rounded up to whole gigabytes."""
+    return f'{max(1, math.ceil(mem_mb / 1024))}G'
+
+
+def suggest_resources(jobs):
+    """Suggest {'cpus': N, 'mem': 'xG'} covering the peak usage of `jobs` with headroom.
+
+    Jobs without usage accounting (no MaxRSS or TotalCPU) are left out; None
+    is returned if no job has any.
+    """
+    jobs = [job for job in jobs if job.elapsed > 0 and job.max_rss_mb > 0 and job.cpu_time > 0]
+    if not jobs:
+        return None
+    cpus = max(MIN_CPUS, math.ceil(max(job.cpus_used for job in jobs) * HEADROOM))
+    mem_mb = max(MIN_MEM_MB, max(job.max_rss_mb for job in jobs) * HEADROOM)
+    return {'cpus': cpus, 'mem': format_mem(mem_mb)}
@@ -0,0 +1,157 @@
+"""Local store of finished and running GPU jobs from `sacct`, for usage statistics.
+
+Records are ingested incrementally: each update only asks `sacct` for jobs
+active since the previous update (the watermark), so months of history are
+fetched from slurmdbd once. Aggregations then run against the local SQLite
+database.
+"""
+import os
+import socket
+import sqlite3
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from .slurm_parser import Tres, parse_slurm_time
+from .utils import user_data_dir
+
+SACCT_FIELDS = 'JobIDRaw,User,Partition,AllocTRES,Start,End,State'
+SACCT_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+# Re-fetch a little before the watermark in case sacct records land late.
+WATERMARK_OVERLAP = 300
+
+GROUP_COLUMNS = {'user': 'user', 'partition': 'partition', 'type': 'gpu_type'}
+
+
+def default_store_path():
+    # Keyed by host like the topology cache, as user_data_dir may be shared
+    # by several clusters.
+    return os.path.join(user_data_dir, f'cluster-stats-{socket.gethostname()}.sqlite')
+
+
+def format_sacct_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime(SACCT_TIME_FORMAT)
+
+
+def parse_sacct_usage(output, now):
+    """Yield (job_id, user, partition, gpu_type, gpus, start, end, state) for GPU jobs.
+
+    Running jobs are given `now` as their end, and are replaced by the next
+    update that sees them.
+    """
+    for line in output.split('\n'):
+        parts = line.split('|')
+        if len(parts) < 7:
+            continue
+        job_id, user, partition, alloc_tres, start, end, state = parts[:7]
+        tres = Tres.parse(alloc_tres)
+        start = parse_slurm_time(start)
+        if not tres.gpus or start is None:
+            continue
+        end = parse_slurm_time(end)
+        end = end.timestamp() if end is not None else now
+        yield (job_id, user, partition, tres.gpu_type or '', tres.gpus,
+               int(start.timestamp()), int(end), state.split(' ', 1)[0])
+
+
+class UsageStore:
+    """SQLite database of GPU job allocations."""
+
+    def __init__(self, path=None):
+        self.path = path or default_store_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY, user TEXT, partition TEXT, gpu_type TEXT,
+                gpus INTEGER, start_time INTEGER, end_time INTEGER, state TEXT);
+            CREATE INDEX IF NOT EXISTS jobs_end_time ON jobs (end_time);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL);
+        ''')
+
+    def _get_meta(self, key):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def ingest(self, output, now):
+        rows = list(parse_sacct_usage(output, now))
+        self.db.executemany('INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def update(self, fetch, since):
+        """Bring the store up to date and make sure it covers history back to `since`.
+
+        `fetch(start, end)` returns `sacct -P` output with SACCT_FIELDS for jobs
+        active between the two timestamps, or None if sacct failed; the covered
+        history and the watermark only move past windows that were ingested.
+        Returns the number of records ingested.
+        """
+        now = time.time()
+        count = 0
+        history_start = self._get_meta('history_start')
+        watermark = self._get_meta('watermark')
+        with self.db:
+            if history_start is None or watermark is None:
+                output = fetch(since, now)
+                if output is not None:
+                    count += self.ingest(output, now)
+                    self._set_meta('history_start', since)
+                    self._set_meta('watermark', now)
+                return count
+            if since < history_start:
+                output = fetch(since, history_start)
+                if output is not None:
+                    count += self.ingest(output, now)
+                    self._set_meta('history_start', since)
+            output = fetch(watermark - WATERMARK_OVERLAP, now)
+            if output is not None:
+                count += self.ingest(output, now)
+                self._set_meta('watermark', now)
+        return count
+
+    @property
+    def watermark(self):
+        return self._get_meta('watermark')
+
+    def gpu_hours(self, by, since, until=None, user=None):
+        """Return [(key, gpu_hours, jobs)] for usage between `since` and `until`, largest first.
+
+        `by` is one of 'user', 'partition', 'type' or 'day'. Jobs overlapping
+        the window only count the part that falls inside it.
+        """
+        until = until or time.time()
+        where = 'end_time > ? AND start_time < ?'
+        params = [since, until]
+        if user:
+            where += ' AND user = ?'
+            params.append(user)
+        if by == 'day':
+            return self._gpu_hours_by_day(where, params, since, until)
+        column = GROUP_COLUMNS[by]
+        query = (f'SELECT {column}, '
+                 f'SUM(gpus * (MIN(end_time, ?) - MAX(start_time, ?))) / 3600.0, COUNT(*) '
+                 f'FROM jobs WHERE {where} GROUP BY {column} ORDER BY 2 DESC')
+        return self.db.execute(query, [until, since] + params).fetchall()
+
+    def _gpu_hours_by_day(self, where, params, since, until):
+        hours = defaultdict(float)
+        jobs = defaultdict(set)
+        query = f'SELECT job_id, gpus, start_time, end_time FROM jobs WHERE {where}'
+        for job_id, gpus, start, end in self.db.execute(query, params):
+            start = max(start, since)
+            end = min(end, until)
+            # Split the allocation at local midnights
+            while start < end:
+                day = datetime.fromtimestamp(start).date()
+                next_day = datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp()
+                chunk_end = min(end, next_day)
+                hours[day.isoformat()] += gpus * (chunk_end - start) / 3600
+                jobs[day.isoformat()].add(job_id)
+                start = chunk_end
+        return [(day, hours[day], len(jobs[day])) for day in sorted(hours)]
+
+    def close(self):
+        self.db.close()
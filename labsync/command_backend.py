@@ -0,0 +1,58 @@
+"""Backends that run the SLURM commands issued by `labsync.cluster`.
+
+`ShellBackend` runs commands with the system shell. Another backend, such as
+`labsync.fake_slurm.FakeSlurm`, can be installed with `set_backend`, or for
+the `lab` command line through the LABSYNC_FAKE_SLURM environment variable,
+e.g. `LABSYNC_FAKE_SLURM=nodes=1000,jobs=10000 lab ls`.
+"""
+import asyncio
+import os
+import subprocess
+
+
+class ShellBackend:
+    """Run commands in a shell subprocess."""
+
+    def run(self, cmd):
+        """Run `cmd` and return (returncode, stdout, stderr)."""
+        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        return result.returncode, result.stdout, result.stderr
+
+    async def run_async(self, cmd, timeout=None):
+        """Run `cmd` in the event loop; the returncode is None if it timed out."""
+        proc = await asyncio.create_subprocess_shell(
+            cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return None, '', ''
+        return proc.returncode, stdout.decode(), stderr.decode()
+
+    def run_interactive(self, cmd):
+        """Run `cmd` attached to the terminal and return its exit code."""
+        return subprocess.run(cmd, shell=True).returncode
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        spec = os.environ.get('LABSYNC_FAKE_SLURM')
+        if spec:
+            from .fake_slurm import FakeSlurm
+            _backend = FakeSlurm.from_spec(spec)
+        else:
+            _backend = ShellBackend()
+    return _backend
+
+
+def set_backend(backend):
+    """Install `backend` for all later commands and return the previous one."""
+    global _backend
+    previous = _backend
+    _backend = backend
+    return previous
@@ -0,0 +1,258 @@
+"""A fake SLURM cluster of configurable size, answering `squeue`, `scontrol`, `sinfo` etc.
+
+`FakeSlurm` generates a consistent cluster state (nodes, running jobs placed
+on free GPUs, pending jobs that did not fit) and renders it in the output
+formats that `labsync.cluster` parses. It is a command backend (see
+`labsync.command_backend`), so the cluster commands and their scaling can be
+exercised without a real cluster. Every command it answers is recorded in
+`calls`, standing in for one subprocess.
+"""
+import os
+import random
+import re
+import shlex
+from .hostlist import compress_hostlist
+
+_FORMAT_RE = re.compile(r'%([a-zA-Z])')
+_SHELL_SUFFIX_RE = re.compile(r'\s*(2>/dev/null|\|\|\s*true)\s*')
+
+GPU_TYPES = ['a100', 'h100', 'v100']
+START_TIME = '2026-01-01T00:00:00'
+
+
+class FakeJob:
+    __slots__ = ('job_id', 'name', 'user', 'state', 'partition', 'gpus_per_node',
+                 'gpu_type', 'nodes', 'reason')
+
+    def __init__(self, job_id, name, user, partition, gpus_per_node, gpu_type):
+        self.job_id = job_id
+        self.name = name
+        self.user = user
+        self.state = 'PENDING'
+        self.partition = partition
+        self.gpus_per_node = gpus_per_node
+        self.gpu_type = gpu_type
+        # [(node name, first GPU index)]
+        self.nodes = []
+        self.reason = 'Resources'
+
+
+class FakeSlurm:
+    """A generated cluster of `num_nodes` GPU nodes and `num_jobs` jobs."""
+
+    def __init__(self, num_nodes=10, num_jobs=100, gpus_per_node=8, num_users=50,
+                 user=None, seed=0):
+        self.num_nodes = num_nodes
+        self.num_jobs = num_jobs
+        self.gpus_per_node = gpus_per_node
+        self.user = user or os.getenv('USER', 'unknown')
+        self.calls = []
+        self._responses = {}
+        rng = random.Random(seed)
+        width = len(str(max(num_nodes - 1, 1)))
+
+        self.nodes = {}
+        for i in range(num_nodes):
+            name = f'gpu{i:0{width}d}'
+            gpu_type = GPU_TYPES[i * len(GPU_TYPES) // max(num_nodes, 1)]
+            state = 'DOWN' if rng.random() < 0.01 else 'IDLE'
+            self.nodes[name] = {'gpu_type': gpu_type, 'state': state, 'free': gpus_per_node,
+                                'partitions': ['gpu', gpu_type]}
+
+        self.jobs = {}
+        node_names = [name for name, node in self.nodes.items() if node['state'] != 'DOWN']
+        cursor = 0
+        for i in range(num_jobs):
+            job_id = str(100000 + i)
+            # Every 50th job is the current user's, so `lab jobs` and `lab bash` find some
+            user = self.user if i % 50 == 0 else f'user{rng.randrange(num_users)}'
+            gpus = rng.choice([1, 1, 2, 4, 8])
+            multi_node = gpus == 8 and rng.random() < 0.3
+            gpu_type = rng.choice(GPU_TYPES) if rng.random() < 0.3 else None
+            partition = gpu_type or 'gpu'
+            job = FakeJob(job_id, f'train_{i}', user, partition, gpus, gpu_type)
+            self.jobs[job_id] = job
+
+            # First fit from a moving cursor, so that placing all jobs stays linear
+            needed = 2 if multi_node else 1
+            for step in range(min(len(node_names), 64)):
+                name = node_names[(cursor + step) % len(node_names)]
+                node = self.nodes[name]
+                if node['free'] >= gpus and (gpu_type is None or node['gpu_type'] == gpu_type):
+                    job.nodes.append((name, gpus_per_node - node['free']))
+                    node['free'] -= gpus
+                    if len(job.nodes) == needed:
+                        break
+            if len(job.nodes) == needed:
+                job.state = 'RUNNING'
+                job.reason = 'None'
+            else:
+                for name, first in job.nodes:
+                    self.nodes[name]['free'] += gpus
+                job.nodes = []
+                job.reason = rng.choice(['Resources', 'Priority'])
+            if node_names and self.nodes[node_names[cursor % len(node_names)]]['free'] == 0:
+                cursor += 1
+
+        for node in self.nodes.values():
+            if node['state'] != 'DOWN':
+                used = gpus_per_node - node['free']
+                node['state'] = 'IDLE' if not used else 'ALLOCATED' if not node['free'] else 'MIXED'
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Build from a `key=value,...` spec such as `nodes=1000,jobs=10000`."""
+        options = {}
+        for item in spec.split(','):
+            key, _, value = item.partition('=')
+            key = key.strip()
+            if key in ('nodes', 'jobs', 'gpus_per_node', 'users', 'seed'):
+                options[key] = int(value)
+        return cls(num_nodes=options.get('nodes', 10), num_jobs=options.get('jobs', 100),
+                   gpus_per_node=options.get('gpus_per_node', 8),
+                   num_users=options.get('users', 50), seed=options.get('seed', 0))
+
+    # Command backend interface
+
+    def run(self, cmd):
+        self.calls.append(cmd)
+        if cmd not in self._responses:
+            self._responses[cmd] = self._respond(cmd)
+        return self._responses[cmd]
+
+    async def run_async(self, cmd, timeout=None):
+        return self.run(cmd)
+
+    def run_interactive(self, cmd):
+        return self.run(cmd)[0]
+
+    def reset_calls(self):
+        self.calls = []
+
+    # Command emulation
+
+    def _respond(self, cmd):
+        try:
+            argv = shlex.split(_SHELL_SUFFIX_RE.sub(' ', cmd))
+        except ValueError:
+            return 2, '', f'Cannot parse {cmd}'
+        if not argv:
+            return 0, '', ''
+        program, options = argv[0], argv[1:]
+        if program == 'squeue':
+            return 0, self._squeue(options), ''
+        if program == 'scontrol':
+            return self._scontrol(options)
+        if program == 'sinfo':
+            return 0, self._sinfo(options), ''
+        if program in ('sacct', 'srun', 'scancel'):
+            return 0, '', ''
+        if program == 'sbatch':
+            return 0, f'Submitted batch job {100000 + self.num_jobs}\n', ''
+        return 127, '', f'{program}: command not found'
+
+    def _job_values(self, job):
+        node_list = compress_hostlist(name for name, _ in job.nodes)
+        running = job.state == 'RUNNING'
+        tres = f'gres/gpu:{job.gpu_type}:{job.gpus_per_node}' if job.gpu_type else f'gres/gpu:{job.gpus_per_node}'
+        return {
+            'i': job.job_id, 'F': job.job_id, 'u': job.user, 'j': job.name, 'N': node_list,
+            'S': START_TIME if running else 'N/A', 'T': job.state, 'P': job.partition,
+            'b': tres, 'M': '1:00:00' if running else '0:00', 'l': '2-00:00:00', 'r': job.reason,
+        }
+
+    def _squeue(self, options):
+        fmt = '%i %j %T'
+        users = states = job_ids = None
+        sort_start = False
+        i = 0
+        while i < len(options):
+            option = options[i]
+            value = options[i + 1] if i + 1 < len(options) else ''
+            if option == '-o':
+                fmt, i = value, i + 1
+            elif option == '-u':
+                users, i = set(value.split(',')), i + 1
+            elif option == '-t':
+                states, i = set(value.upper().split(',')), i + 1
+            elif option == '-j':
+                job_ids, i = set(value.split(',')), i + 1
+            elif option.startswith('--sort=') and 'S' in option:
+                sort_start = True
+            i += 1
+        jobs = self.jobs.values() if job_ids is None else [self.jobs[j] for j in job_ids if j in self.jobs]
+        lines = []
+        for job in jobs:
+            if (users is not None and job.user not in users) or (states is not None and job.state not in states):
+                continue
+            values = self._job_values(job)
+            lines.append(_FORMAT_RE.sub(lambda match: values.get(match.group(1), ''), fmt))
+        if sort_start:
+            lines.reverse()
+        return '\n'.join(lines)
+
+    def _job_record(self, job):
+        gpus = job.gpus_per_node * max(len(job.nodes), 1)
+        typed = f',gres/gpu:{job.gpu_type}={gpus}' if job.gpu_type else ''
+        node_list = compress_hostlist(name for name, _ in job.nodes) or '(null)'
+        fields = [
+            f'JobId={job.job_id} JobName={job.name} UserId={job.user}(1000) GroupId=lab(100)',
+            f'Priority=1000 Account=lab QOS=normal JobState={job.state} Reason={job.reason}',
+            f'Partition={job.partition} NodeList={node_list} NumNodes={max(len(job.nodes), 1)} NumCPUs=8',
+            f'ReqTRES=cpu=8,mem=64G,node={max(len(job.nodes), 1)},gres/gpu={gpus}{typed}',
+        ]
+        if job.state == 'RUNNING':
+            fields.append(f'AllocTRES=cpu=8,mem=64G,node={len(job.nodes)},gres/gpu={gpus}{typed}')
+            for name, first in job.nodes:
+                gpu_type = self.nodes[name]['gpu_type']
+                last = first + job.gpus_per_node - 1
+                indices = str(first) if first == last else f'{first}-{last}'
+                fields.append(f'Nodes={name} CPU_IDs=0-7 Mem=65536 '
+                              f'GRES=gpu:{gpu_type}:{job.gpus_per_node}(IDX:{indices})')
+        fields.append(f'TresPerNode=gres/gpu:{job.gpus_per_node} Command=/home/{job.user}/run.sh '
+                      f'WorkDir=/home/{job.user} StdOut=/home/{job.user}/slurm/slurm-{job.job_id}.out')
+        return ' '.join(fields)
+
+    def _node_record(self, name, node):
+        used = self.gpus_per_node - node['free']
+        return (f'NodeName={name} Arch=x86_64 CPUTot=64 AvailableFeatures={node["gpu_type"]},gpu '
+                f'ActiveFeatures={node["gpu_type"]},gpu Gres=gpu:{node["gpu_type"]}:{self.gpus_per_node}(S:0-1) '
+                f'NodeAddr={name} RealMemory=1024000 State={node["state"]} '
+                f'Partitions={",".join(node["partitions"])} '
+                f'CfgTRES=cpu=64,mem=1000G,gres/gpu={self.gpus_per_node} AllocTRES=gres/gpu={used}')
+
+    def _scontrol(self, options):
+        positional = [option for option in options if not option.startswith('-')]
+        if positional[:2] == ['show', 'job']:
+            if len(positional) > 2:
+                job = self.jobs.get(positional[2])
+                if job is None:
+                    return 1, '', 'slurm_load_jobs error: Invalid job id specified'
+                return 0, self._job_record(job), ''
+            return 0, '\n'.join(self._job_record(job) for job in self.jobs.values()), ''
+        if positional[:2] == ['show', 'nodes']:
+            return 0, '\n'.join(self._node_record(name, node) for name, node in self.nodes.items()), ''
+        return 1, '', f'Unsupported scontrol command: {" ".join(options)}'
+
+    def _sinfo(self, options):
+        fmt = options[options.index('-o') + 1] if '-o' in options else '%N %P %T'
+        per_node = '-N' in options
+        lines = []
+        if per_node:
+            for name, node in self.nodes.items():
+                for partition in node['partitions']:
+                    values = {'N': name, 'P': partition + ('*' if partition == 'gpu' else ''),
+                              'T': node['state'].lower(), 'f': f'{node["gpu_type"]},gpu',
+                              'G': f'gpu:{node["gpu_type"]}:{self.gpus_per_node}'}
+                    lines.append(_FORMAT_RE.sub(lambda match: values.get(match.group(1), ''), fmt))
+            return '\n'.join(lines)
+        # Without -N, alike nodes of a partition are reported as one hostlist
+        groups = {}
+        for name, node in self.nodes.items():
+            for partition in node['partitions']:
+                groups.setdefault((partition, node['gpu_type'], node['state']), []).append(name)
+        for (partition, gpu_type, state), names in groups.items():
+            values = {'N': compress_hostlist(names), 'P': partition + ('*' if partition == 'gpu' else ''),
+                      'T': state.lower(), 'f': f'{gpu_type},gpu', 'G': f'gpu:{gpu_type}:{self.gpus_per_node}'}
+            lines.append(_FORMAT_RE.sub(lambda match: values.get(match.group(1), ''), fmt))
+        return '\n'.join(lines)
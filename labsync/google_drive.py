@@ -4,16 +4,20 @@ import argparse
 import os
 import json
 import time
-from multiprocessing import Pool
+import hashlib
+import queue
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from .utils import user_data_dir
 from pydrive2.auth import GoogleAuth
 from pydrive2.drive import GoogleDrive
 from pydrive2.files import ApiRequestError
 from tqdm import tqdm
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaFileUpload, MediaUpload
 from googleapiclient.errors import HttpError
-from googleapiclient import errors
 from googleapiclient.discovery import build
 
 
@@ -24,6 +28,41 @@ for name in logging.root.manager.loggerDict:
 
 credential_file = os.path.join(user_data_dir, 'google_drive_credential.txt')
 client_config_file = os.path.join(user_data_dir, 'client_secrets.json')
+manifest_dir = os.path.join(user_data_dir, 'gd_manifests')
+session_dir = os.path.join(user_data_dir, 'gd_sessions')
+
+# Refresh the shared access token when it expires within this margin.
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+# Drive expires resumable upload sessions after a week; older journaled sessions are not resumed.
+SESSION_MAX_AGE = timedelta(days=6)
+
+# Compressors of `lab gd -r`: command reading a tar stream on stdin, archive suffix and MIME type.
+COMPRESSORS = {
+    'gzip': (['gzip', '-c'], '.tgz', 'application/gzip'),
+    'pigz': (['pigz', '-c'], '.tgz', 'application/gzip'),
+    'zstd': (['zstd', '-c', '-q', '-T0'], '.tar.zst', 'application/zstd'),
+}
+
+# Streamed archives are read from the compressor in blocks, with at most
+# STREAM_QUEUE_BLOCKS buffered ahead of the upload.
+STREAM_BLOCK_SIZE = 1024 * 1024
+STREAM_QUEUE_BLOCKS = 16
+
+# Resumable uploads start with INITIAL_CHUNK_SIZE chunks, then aim at chunks
+# taking CHUNK_SECONDS at the measured throughput, halving after an error.
+# Chunk sizes are multiples of CHUNK_ALIGN, as Drive requires.
+CHUNK_ALIGN = 256 * 1024
+MIN_CHUNK_SIZE = 1024 * 1024
+INITIAL_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 256 * 1024 * 1024
+CHUNK_SECONDS = 30
+
+# Chunk buffers of all concurrent uploads stay within this budget (in MB) by default.
+DEFAULT_UPLOAD_MEMORY = 512
+
+# Files up to this size are uploaded with a single multipart request.
+SMALL_FILE_SIZE = 5 * 1024 * 1024
 
 
 def get_parser():
@@ -32,15 +71,33 @@ def get_parser():
         description='Upload files and directories to Google Drive'
     )
     parser.add_argument('-r', action='store_true', help='Upload directory (will be archived)')
+    parser.add_argument('--compress', type=str, default='gzip', choices=list(COMPRESSORS),
+                        help='Compressor of archives, pigz and zstd use all cores (default: gzip)')
     parser.add_argument('-d', '--direct', action='store_true', help='Upload directory directly without archiving')
     parser.add_argument('-f', '--folder', type=str, default=None, help='Folder ID or folder name to upload to')
-    parser.add_argument('-j', '--njobs', type=int, default=1, help='Number of parallel upload jobs (default: 1)')
+    parser.add_argument('-j', '--njobs', type=int, default=1, help='Number of parallel upload threads (default: 1)')
     parser.add_argument('-c', '--continue', dest='continue_upload', action='store_true', help='Skip files that already exist in destination')
     parser.add_argument('--max-files', type=int, default=100, help='Maximum files in directory before auto-archiving (default: 100)')
+    parser.add_argument('--max-memory', type=int, default=DEFAULT_UPLOAD_MEMORY,
+                        help=f'Memory for upload chunks shared by all threads, in MB (default: {DEFAULT_UPLOAD_MEMORY})')
     parser.add_argument('files', type=str, nargs='+', help='File path')
     return parser
 
 
+def get_sync_parser():
+    parser = argparse.ArgumentParser(
+        prog='lab gd sync',
+        description='Upload only new or changed files, updating changed ones in place'
+    )
+    parser.add_argument('-f', '--folder', type=str, default=None, help='Folder ID or folder name to sync to')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='Show what would be uploaded without uploading')
+    parser.add_argument('-j', '--njobs', type=int, default=1, help='Number of parallel upload threads (default: 1)')
+    parser.add_argument('--max-memory', type=int, default=DEFAULT_UPLOAD_MEMORY,
+                        help=f'Memory for upload chunks shared by all threads, in MB (default: {DEFAULT_UPLOAD_MEMORY})')
+    parser.add_argument('files', type=str, nargs='+', help='File or directory path')
+    return parser
+
+
 def _count_files_in_directory(path):
     """Count total number of files in a directory recursively."""
     count = 0
@@ -113,28 +170,82 @@ def find_folder_by_name(drive, folder_name):
     )
 
 
-def file_exists_in_drive(drive, filename, parent_id=None, drive_id=None):
-    """Check if a file with the given name already exists in the destination."""
-    query = f"title='{filename}' and trashed=false"
-    if parent_id:
-        query += f" and '{parent_id}' in parents"
-    elif drive_id:
-        query += f" and '{drive_id}' in parents"
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
 
-    file_list = drive.ListFile({
-        'q': query,
-        'corpora': 'allDrives',
-        'includeItemsFromAllDrives': True,
-        'supportsAllDrives': True
-    }).GetList()
-    return len(file_list) > 0
+
+class FolderIndex:
+    """Listing of remote folders, fetched with one paginated query per folder.
+
+    Maps each folder to {title: entry} with the id, size and md5 of its
+    items, so existence checks are dictionary lookups. Entries are added
+    as uploads finish. One index is shared by all paths of a command and by
+    the upload threads, so each folder is listed at most once.
+    """
+
+    def __init__(self, drive, http=None):
+        self.drive = drive
+        # Returns the HTTP client of the calling thread, when used from several threads
+        self.http = http
+        self.folders = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def folder_key(parent_id=None, drive_id=None):
+        return parent_id or drive_id or 'root'
+
+    def listing(self, parent_id=None, drive_id=None):
+        key = self.folder_key(parent_id, drive_id)
+        with self.lock:
+            return self._listing(key)
+
+    def _listing(self, key):
+        if key not in self.folders:
+            entries = {}
+            file_list = self.drive.ListFile({
+                'q': f"'{key}' in parents and trashed=false",
+                'maxResults': 1000,
+                'corpora': 'allDrives',
+                'includeItemsFromAllDrives': True,
+                'supportsAllDrives': True
+            })
+            if self.http is not None:
+                file_list.http = self.http()
+            for item in file_list.GetList():
+                # Keep the first of several items with the same title
+                entries.setdefault(item['title'], self._entry(item))
+            self.folders[key] = entries
+        return self.folders[key]
+
+    @staticmethod
+    def _entry(item):
+        return {
+            'id': item['id'],
+            'size': int(item['fileSize']) if item.get('fileSize') else None,
+            'md5': item.get('md5Checksum'),
+            'is_folder': item.get('mimeType') == FOLDER_MIME_TYPE,
+        }
+
+    def lookup(self, name, parent_id=None, drive_id=None):
+        return self.listing(parent_id, drive_id).get(name)
+
+    def add(self, drive_file, parent_id=None, drive_id=None):
+        """Record an uploaded or created file in its folder's listing."""
+        key = self.folder_key(parent_id, drive_id)
+        with self.lock:
+            if key in self.folders:
+                self.folders[key][drive_file['title']] = self._entry(drive_file)
+
+    def add_empty_folder(self, folder_id):
+        """Record the listing of a folder just created, so it is not queried."""
+        with self.lock:
+            self.folders[folder_id] = {}
 
 
 def create_folder(drive, folder_name, parent_id=None, drive_id=None):
     """Create a folder in Google Drive and return its ID."""
     metadata = {
         'title': folder_name,
-        'mimeType': 'application/vnd.google-apps.folder',
+        'mimeType': FOLDER_MIME_TYPE,
         'supportsAllDrives': True
     }
     if drive_id:
@@ -176,111 +287,524 @@ class ProgressFileWrapper:
         self.close()
 
 
-def upload_file_with_progress(drive_file, file_path):
-    """Upload a file with progress bar using chunked resumable upload."""
+class MemoryBudget:
+    """Bytes of chunk buffers that concurrent uploads may hold at once."""
+
+    def __init__(self, total):
+        self.total = total
+        self.used = 0
+        self.uploads = 0
+        self.condition = threading.Condition()
+
+    def share(self):
+        """The budget of each of the running uploads."""
+        with self.condition:
+            return self.total // max(1, self.uploads)
+
+    def acquire(self, size):
+        with self.condition:
+            # A chunk larger than the budget still goes through, alone
+            self.condition.wait_for(lambda: self.used == 0 or self.used + size <= self.total)
+            self.used += size
+
+    def release(self, size):
+        with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+
+class ChunkSizer:
+    """Chunk size of one resumable upload, adapted to its throughput and errors.
+
+    Used as a context manager for the duration of the upload, so that the
+    budget is shared among the running uploads. `buffers` is the number of
+    chunk-sized buffers the upload holds.
+    """
+
+    def __init__(self, budget, buffers=1):
+        self.budget = budget
+        self.buffers = buffers
+        self.target = INITIAL_CHUNK_SIZE
+        self.size = INITIAL_CHUNK_SIZE
+        self.throughput = None
+        self.start = None
+
+    def __enter__(self):
+        with self.budget.condition:
+            self.budget.uploads += 1
+        return self
+
+    def __exit__(self, *args):
+        with self.budget.condition:
+            self.budget.uploads -= 1
+            self.budget.condition.notify_all()
+
+    def reserve(self):
+        """Choose the size of the next chunk and reserve its buffers from the budget."""
+        limit = min(MAX_CHUNK_SIZE, self.budget.share() // self.buffers)
+        size = max(MIN_CHUNK_SIZE, min(self.target, limit))
+        self.size = int(size) // CHUNK_ALIGN * CHUNK_ALIGN
+        self.budget.acquire(self.size * self.buffers)
+        self.start = time.monotonic()
+        return self.size
+
+    def release(self, sent=None):
+        """Release the chunk's buffers; `sent` is the number of bytes committed, None after an error."""
+        self.budget.release(self.size * self.buffers)
+        if sent is None:
+            self.target = self.size // 2
+            return
+        if sent:
+            rate = sent / max(time.monotonic() - self.start, 1e-3)
+            self.throughput = rate if self.throughput is None else (self.throughput + rate) / 2
+            # Grow at most twice per chunk, so that a single fast chunk does not overshoot
+            self.target = min(self.throughput * CHUNK_SECONDS, 2 * self.size)
+
+
+class ChunkedFileUpload(MediaFileUpload):
+    """A resumable MediaFileUpload whose chunk size can change between chunks."""
+
+    def __init__(self, filename, mimetype):
+        super().__init__(filename, mimetype=mimetype, resumable=True, chunksize=INITIAL_CHUNK_SIZE)
+        self.chunk_size = INITIAL_CHUNK_SIZE
+
+    def chunksize(self):
+        return self.chunk_size
+
+
+def send_chunk(request, media, sizer, http=None):
+    """Send the next chunk of a resumable `request`, sized by `sizer`."""
+    media.chunk_size = sizer.reserve()
+    offset = request.resumable_progress
+    try:
+        status, response = request.next_chunk(http=http)
+    except BaseException:
+        sizer.release(None)
+        raise
+    sizer.release(media.chunk_size if response is not None else max(0, request.resumable_progress - offset))
+    return status, response
+
+
+def upload_small_file(drive_file, file_path, http=None):
+    """Upload a file of at most SMALL_FILE_SIZE in a single multipart request."""
+    media_body = MediaFileUpload(file_path, mimetype=drive_file['mimeType'], resumable=False)
+    param = {'supportsAllDrives': True, 'body': drive_file.GetChanges(), 'media_body': media_body}
+    files = drive_file.auth.service.files()
+    if drive_file.uploaded or drive_file.get('id') is not None:
+        request = files.update(fileId=drive_file['id'], **param)
+    else:
+        request = files.insert(**param)
+    try:
+        response = request.execute(http=http, num_retries=5)
+    except HttpError as e:
+        raise ApiRequestError(e)
+    drive_file.uploaded = True
+    drive_file.UpdateMetadata(response)
+
+
+class UploadSession:
+    """Journal of the resumable upload session of a local file, saved under `session_dir`.
+
+    The session URI and the offset committed by the server are saved after
+    every chunk, so an upload interrupted by an error or by killing `lab gd`
+    continues where it stopped. The journal is keyed by the file's path,
+    size and mtime and by its destination, and is removed once the upload
+    completes.
+    """
+
+    def __init__(self, file_path, drive_file):
+        stat = os.stat(file_path)
+        destination = drive_file.get('id') or (drive_file.get('title'), drive_file.get('parents'))
+        key = json.dumps([os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, destination])
+        self.path = os.path.join(session_dir, f'{hashlib.sha1(key.encode()).hexdigest()}.json')
+        self.uri = None
+        self.created = None
+
+    def load(self):
+        """Return the journaled session URI, or None if there is none to resume."""
+        try:
+            with open(self.path, 'r') as f:
+                entry = json.load(f)
+            created = datetime.fromtimestamp(entry['created'])
+        except (OSError, ValueError, KeyError):
+            return None
+        if datetime.now() - created > SESSION_MAX_AGE:
+            self.remove()
+            return None
+        self.uri, self.created = entry['uri'], entry['created']
+        return self.uri
+
+    def save(self, uri, offset):
+        if uri != self.uri:
+            self.uri, self.created = uri, time.time()
+        os.makedirs(session_dir, exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'uri': uri, 'offset': offset, 'created': self.created}, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        self.uri = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def query_upload_session(http, uri, size):
+    """Ask Drive for the state of a resumable session.
+
+    Returns (committed offset, None) for an incomplete upload, (size, file
+    metadata) for a completed one, and (None, None) if the session is gone.
+    """
+    resp, content = http.request(uri, method='PUT', headers={
+        'Content-Length': '0',
+        'Content-Range': f'bytes */{size}',
+    })
+    if resp.status in (200, 201):
+        return size, json.loads(content)
+    if resp.status == 308:
+        committed = resp.get('range')
+        return (int(committed.rsplit('-', 1)[1]) + 1 if committed else 0), None
+    if 400 <= resp.status < 500:
+        return None, None
+    raise HttpError(resp, content, uri=uri)
+
+
+def upload_file_with_progress(drive_file, file_path, http=None, budget=None):
+    """Upload a file with progress bar using chunked resumable upload.
+
+    The session is journaled in an UploadSession: after an error, or in a
+    later run, the upload continues from the offset committed by the server.
+    Chunks are sized by a ChunkSizer within the MemoryBudget `budget`, and
+    small files are uploaded in one request instead.
+    `http` is the HTTP client to send the chunks with, if not the service's.
+    """
     file_size = os.path.getsize(file_path)
-    chunk_size = 256 * 1024 * 1024
 
     if drive_file.get('mimeType') is None:
         drive_file['mimeType'] = 'application/octet-stream'
 
-    with tqdm(total=file_size, unit='B', unit_scale=True, desc=os.path.basename(file_path)) as pbar:
+    if file_size <= SMALL_FILE_SIZE:
+        upload_small_file(drive_file, file_path, http)
+        return
+
+    if budget is None:
+        budget = MemoryBudget(DEFAULT_UPLOAD_MEMORY * 1024 * 1024)
+    media_body = ChunkedFileUpload(file_path, drive_file['mimeType'])
+
+    param = {'supportsAllDrives': True}
+    param['body'] = drive_file.GetChanges()
+
+    if drive_file.uploaded or drive_file.get('id') is not None:
+        request = drive_file.auth.service.files().update(
+            fileId=drive_file['id'],
+            media_body=media_body,
+            **param
+        )
+    else:
+        request = drive_file.auth.service.files().insert(
+            media_body=media_body,
+            **param
+        )
+
+    session = UploadSession(file_path, drive_file)
+    with ChunkSizer(budget) as sizer, \
+            tqdm(total=file_size, unit='B', unit_scale=True, desc=os.path.basename(file_path)) as pbar:
+        response = None
+        uri = session.load()
+        if uri is not None:
+            committed, response = query_upload_session(http or request.http, uri, file_size)
+            if committed is None:
+                session.remove()
+            else:
+                pbar.write(f'Resuming upload of {file_path} at {committed} bytes')
+                request.resumable_uri = uri
+                request.resumable_progress = committed
+                pbar.n = committed
+                pbar.refresh()
+
         retries = 0
         max_retries = 5
-
-        while retries < max_retries:
+        while response is None:
             try:
-                media_body = MediaFileUpload(
-                    file_path,
-                    mimetype=drive_file['mimeType'],
-                    resumable=True,
-                    chunksize=chunk_size
-                )
-
-                param = {'supportsAllDrives': True}
-                param['body'] = drive_file.GetChanges()
-
-                if drive_file.uploaded or drive_file.get('id') is not None:
-                    request = drive_file.auth.service.files().update(
-                        fileId=drive_file['id'],
-                        media_body=media_body,
-                        **param
-                    )
-                else:
-                    request = drive_file.auth.service.files().insert(
-                        media_body=media_body,
-                        **param
-                    )
-
-                response = None
-                while response is None:
-                    status, response = request.next_chunk()
-                    if status:
-                        pbar.n = int(status.progress() * file_size)
-                        pbar.refresh()
-
-                drive_file.uploaded = True
-                drive_file.UpdateMetadata(response)
-                pbar.n = file_size
-                pbar.refresh()
-                break
-
-            except HttpError as e:
-                if e.resp.status in [500, 502, 503, 504]:
-                    retries += 1
-                    if retries < max_retries:
-                        wait_time = 2 ** retries
-                        pbar.write(f'Upload error (attempt {retries}/{max_retries}), retrying in {wait_time}s...')
-                        time.sleep(wait_time)
-                        pbar.n = 0
-                        pbar.refresh()
-                    else:
-                        raise ApiRequestError(e)
-                else:
+                status, response = send_chunk(request, media_body, sizer, http)
+            except BaseException as e:
+                # Also journal a session just created when the upload is interrupted
+                if request.resumable_uri is not None:
+                    session.save(request.resumable_uri, request.resumable_progress)
+                if not isinstance(e, Exception):
+                    raise
+                if isinstance(e, HttpError) and e.resp.status in [404, 410]:
+                    # The session expired, the next run starts a new one
+                    session.remove()
+                    raise ApiRequestError(e)
+                if isinstance(e, HttpError) and e.resp.status not in [500, 502, 503, 504]:
                     raise ApiRequestError(e)
-            except errors.HttpError as e:
                 retries += 1
-                if retries < max_retries:
-                    wait_time = 2 ** retries
-                    pbar.write(f'Connection error (attempt {retries}/{max_retries}), retrying in {wait_time}s...')
-                    time.sleep(wait_time)
-                    pbar.n = 0
-                    pbar.refresh()
+                if retries >= max_retries:
+                    raise ApiRequestError(e) if isinstance(e, HttpError) else e
+                wait_time = 2 ** retries
+                # The next chunk queries the session for the committed offset and continues from there
+                pbar.write(f'Upload error (attempt {retries}/{max_retries}), resuming in {wait_time}s...')
+                time.sleep(wait_time)
+                continue
+            retries = 0
+            if response is None:
+                session.save(request.resumable_uri, request.resumable_progress)
+                pbar.n = request.resumable_progress
+                pbar.refresh()
+
+        session.remove()
+        drive_file.uploaded = True
+        drive_file.UpdateMetadata(response)
+        pbar.n = file_size
+        pbar.refresh()
+
+
+class ArchiveStream(MediaUpload):
+    """A directory archived by `tar` and a compressor, streamed as resumable upload media.
+
+    A reader thread moves the compressor's output into a bounded queue, so the
+    archive is compressed while earlier chunks are uploading and is never
+    written to disk. The total size is unknown until the compressor exits;
+    bytes are kept from the last offset requested by the upload, so a chunk
+    can be sent again after an error.
+    """
+
+    def __init__(self, path, compress='gzip'):
+        command, _, self._mimetype = COMPRESSORS[compress]
+        self.chunk_size = INITIAL_CHUNK_SIZE
+        self.tar = subprocess.Popen(['tar', '-cf', '-', '-C', path, '.'], stdout=subprocess.PIPE)
+        self.compressor = subprocess.Popen(command, stdin=self.tar.stdout, stdout=subprocess.PIPE)
+        self.tar.stdout.close()
+        self._queue = queue.Queue(maxsize=STREAM_QUEUE_BLOCKS)
+        self._closed = False
+        self._buffer = bytearray()
+        self._buffer_start = 0
+        self._next = 0
+        self._total = None
+        self._error = None
+        self.warning = None
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _put(self, item):
+        while not self._closed:
+            try:
+                self._queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    def _read(self):
+        for block in iter(lambda: self.compressor.stdout.read(STREAM_BLOCK_SIZE), b''):
+            self._put(block)
+        # GNU tar exits with 1 when files changed while being read, e.g. a
+        # checkpoint still being written; the archive is complete otherwise
+        if self.tar.wait() == 1:
+            self.warning = 'tar: some files changed while being archived (exit status 1)'
+        for proc in (self.tar, self.compressor):
+            if proc.wait() != 0 and not (proc is self.tar and proc.returncode == 1):
+                self._put(subprocess.CalledProcessError(proc.returncode, proc.args))
+                return
+        self._put(None)
+
+    def _fill(self, end):
+        """Read from the queue until the buffer reaches offset `end` or the archive ends."""
+        while self._total is None and self._buffer_start + len(self._buffer) < end:
+            if self._error is None:
+                item = self._queue.get()
+                if isinstance(item, Exception):
+                    self._error = item
+                elif item is None:
+                    self._total = self._buffer_start + len(self._buffer)
                 else:
-                    raise ApiRequestError(e)
+                    self._buffer += item
+            if self._error is not None:
+                raise self._error
+
+    def chunksize(self):
+        return self.chunk_size
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        # Read one byte past the next chunk, so that the chunk ending the archive
+        # is sent with the total size instead of an unknown one
+        self._fill(self._next + self.chunk_size + 1)
+        return self._total
+
+    def resumable(self):
+        return True
+
+    def getbytes(self, begin, length):
+        # The upload never goes back before `begin` again, drop what the server has
+        if begin > self._buffer_start:
+            del self._buffer[:begin - self._buffer_start]
+            self._buffer_start = begin
+        self._fill(begin + length)
+        self._next = begin + length
+        return bytes(self._buffer[begin - self._buffer_start:begin - self._buffer_start + length])
+
+    def has_stream(self):
+        return False
+
+    def close(self):
+        """Stop the pipeline, e.g. after a failed upload."""
+        self._closed = True
+        for proc in (self.tar, self.compressor):
+            if proc.poll() is None:
+                proc.kill()
+        self._reader.join()
+        self.compressor.stdout.close()
+
+
+def upload_stream_with_progress(drive_file, media, http=None, budget=None):
+    """Upload an ArchiveStream with progress bar, resuming the session after errors."""
+    if budget is None:
+        budget = MemoryBudget(DEFAULT_UPLOAD_MEMORY * 1024 * 1024)
+    drive_file['mimeType'] = media.mimetype()
+    request = drive_file.auth.service.files().insert(
+        media_body=media,
+        body=drive_file.GetChanges(),
+        supportsAllDrives=True
+    )
+
+    # The stream buffers the chunk being sent and reads the next one ahead
+    with ChunkSizer(budget, buffers=2) as sizer, tqdm(unit='B', unit_scale=True, desc=drive_file['title']) as pbar:
+        retries = 0
+        max_retries = 5
+        response = None
+        while response is None:
+            try:
+                status, response = send_chunk(request, media, sizer, http)
+            except subprocess.CalledProcessError:
+                raise
             except Exception as e:
+                if isinstance(e, HttpError) and e.resp.status not in [500, 502, 503, 504]:
+                    raise ApiRequestError(e)
                 retries += 1
-                if retries < max_retries:
-                    wait_time = 2 ** retries
-                    pbar.write(f'Connection error (attempt {retries}/{max_retries}), retrying in {wait_time}s...')
-                    time.sleep(wait_time)
-                    pbar.n = 0
-                    pbar.refresh()
-                else:
+                if retries >= max_retries:
                     raise
+                wait_time = 2 ** retries
+                # The next chunk queries the session for the committed offset and continues from there
+                pbar.write(f'Upload error (attempt {retries}/{max_retries}), resuming in {wait_time}s...')
+                time.sleep(wait_time)
+                continue
+            retries = 0
+            if status:
+                pbar.n = status.resumable_progress
+                pbar.refresh()
+
+        if media.warning:
+            pbar.write(f"Warning: {media.warning}, uploaded {drive_file['title']} anyway")
+        drive_file.uploaded = True
+        drive_file.UpdateMetadata(response)
+        pbar.n = int(response.get('fileSize', pbar.n))
+        pbar.refresh()
+
+
+class UploadEngine:
+    """Uploads files on a thread pool that shares one authorized session.
+
+    httplib2 is not thread-safe, so each thread gets its own HTTP client.
+    The access token is refreshed by one thread at a time shortly before it
+    expires, instead of every upload re-authenticating.
+    """
+
+    def __init__(self, gauth, njobs=1, max_memory=DEFAULT_UPLOAD_MEMORY):
+        self.gauth = gauth
+        self.budget = MemoryBudget(max_memory * 1024 * 1024)
+        self.drive = GoogleDrive(gauth)
+        self.executor = ThreadPoolExecutor(max_workers=max(1, njobs))
+        self.futures = []
+        self.local = threading.local()
+        self.refresh_lock = threading.Lock()
+
+    def http(self):
+        if getattr(self.local, 'http', None) is None:
+            self.local.http = self.gauth.Get_Http_Object()
+        return self.local.http
+
+    def refresh_token(self):
+        with self.refresh_lock:
+            expiry = self.gauth.credentials.token_expiry
+            if self.gauth.access_token_expired or (
+                    expiry and expiry - datetime.utcnow() < TOKEN_REFRESH_MARGIN):
+                # Over this thread's HTTP client: the shared gauth.http may be in use by the main thread
+                self.gauth.credentials.refresh(self.http())
+                self.gauth.SaveCredentialsFile(credential_file)
+
+    def upload(self, drive_file, path):
+        self.refresh_token()
+        drive_file.http = self.http()
+        upload_file_with_progress(drive_file, path, http=drive_file.http, budget=self.budget)
+
+    def upload_stream(self, drive_file, media):
+        self.refresh_token()
+        drive_file.http = self.http()
+        upload_stream_with_progress(drive_file, media, http=drive_file.http, budget=self.budget)
+
+    def submit(self, label, func, *args, path=None):
+        """Run `func(*args)` on the pool.
+
+        `label` names the top-level path the task belongs to, and `path` the
+        file it uploads, if not the label itself.
+        """
+        self.futures.append((label, path or label, self.executor.submit(func, *args)))
+
+    def wait(self):
+        """Wait for all submitted tasks and return [(label, path, result, exception)]."""
+        results = []
+        for label, path, future in self.futures:
+            try:
+                results.append((label, path, future.result(), None))
+            except Exception as e:
+                results.append((label, path, None, e))
+        self.futures = []
+        return results
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+def _upload(drive_file, path, engine=None):
+    if engine is not None:
+        engine.upload(drive_file, path)
+    else:
+        upload_file_with_progress(drive_file, path)
+
+
+def _upload_into_folder(drive, item, item_path, folder_id, index, engine=None):
+    file = drive.CreateFile({
+        'title': item,
+        'parents': [{'id': folder_id}],
+        'supportsAllDrives': True
+    })
+    _upload(file, item_path, engine)
+    index.add(file, folder_id)
 
 
-def upload_directory_direct(drive, local_path, parent_id=None, drive_id=None, continue_upload=False):
-    """Recursively upload a directory and its contents to Google Drive."""
+def upload_directory_direct(drive, local_path, parent_id=None, drive_id=None, continue_upload=False, index=None,
+                            engine=None, label=None):
+    """Recursively upload a directory and its contents to Google Drive.
+
+    With an `engine`, folders are created here and every file is scheduled
+    on the engine's thread pool.
+    """
     dir_name = os.path.basename(local_path)
+    index = index or FolderIndex(drive)
+    label = label or local_path
 
-    if continue_upload and file_exists_in_drive(drive, dir_name, parent_id, drive_id):
-        query = f"title='{dir_name}' and trashed=false"
-        if parent_id:
-            query += f" and '{parent_id}' in parents"
-        elif drive_id:
-            query += f" and '{drive_id}' in parents"
-        file_list = drive.ListFile({
-            'q': query,
-            'corpora': 'allDrives',
-            'includeItemsFromAllDrives': True,
-            'supportsAllDrives': True
-        }).GetList()
-        folder_id = file_list[0]['id']
+    existing = continue_upload and index.lookup(dir_name, parent_id, drive_id)
+    if existing:
+        folder_id = existing['id']
 
         items_to_upload = []
         for item in os.listdir(local_path):
-            if not file_exists_in_drive(drive, item, folder_id, None):
+            if index.lookup(item, folder_id) is None:
                 items_to_upload.append(item)
 
         if not items_to_upload:
@@ -291,6 +815,8 @@ def upload_directory_direct(drive, local_path, parent_id=None, drive_id=None, co
     else:
         print(f'Creating folder: {dir_name}')
         folder_id = create_folder(drive, dir_name, parent_id, drive_id)
+        index.add({'id': folder_id, 'title': dir_name, 'mimeType': FOLDER_MIME_TYPE}, parent_id, drive_id)
+        index.add_empty_folder(folder_id)
 
     items = os.listdir(local_path)
     items_with_sizes = []
@@ -307,29 +833,84 @@ def upload_directory_direct(drive, local_path, parent_id=None, drive_id=None, co
         item_path = os.path.join(local_path, item)
 
         if os.path.isdir(item_path):
-            upload_directory_direct(drive, item_path, folder_id, None, continue_upload)
+            upload_directory_direct(drive, item_path, folder_id, None, continue_upload, index, engine, label)
         else:
-            if continue_upload and file_exists_in_drive(drive, item, folder_id, None):
+            if continue_upload and index.lookup(item, folder_id) is not None:
                 print(f'Skipping {item} (already exists)')
                 continue
-            file = drive.CreateFile({
-                'title': item,
-                'parents': [{'id': folder_id}],
-                'supportsAllDrives': True
-            })
-            upload_file_with_progress(file, item_path)
+            if engine is not None:
+                engine.submit(label, _upload_into_folder, drive, item, item_path, folder_id, index, engine,
+                              path=item_path)
+            else:
+                _upload_into_folder(drive, item, item_path, folder_id, index)
 
     return folder_id
 
 
-def upload_single_file(drive, file, use_archive, use_direct, folder_id, drive_id, continue_upload=False, max_files=100):
-    """Upload a single file or directory to Google Drive."""
+def _destination_name(folder_id, drive_id):
+    if drive_id:
+        return 'shared drive'
+    elif folder_id:
+        return 'Google Drive folder'
+    return 'Google Drive (My Drive)'
+
+
+def _upload_file_or_archive(drive, file, isdir, folder_id, drive_id, continue_upload, index, engine=None,
+                            compress='gzip'):
+    if isdir:
+        name = os.path.basename(os.path.abspath(file)) + COMPRESSORS[compress][1]
+    else:
+        name = os.path.basename(file)
+
+    if continue_upload and index.lookup(name, folder_id, drive_id) is not None:
+        return f'Skipping {file} (already exists as {name})' if isdir else f'Skipping {file} (already exists)'
+
+    metadata = {
+        'title': name,
+        'supportsAllDrives': True
+    }
+    if drive_id:
+        metadata['parents'] = [{'kind': 'drive#driveId', 'id': drive_id}]
+        metadata['driveId'] = drive_id
+    elif folder_id:
+        metadata['parents'] = [{'id': folder_id}]
+
+    file_obj = drive.CreateFile(metadata)
+    if isdir:
+        media = ArchiveStream(file, compress)
+        try:
+            if engine is not None:
+                engine.upload_stream(file_obj, media)
+            else:
+                upload_stream_with_progress(file_obj, media)
+        finally:
+            media.close()
+        index.add(file_obj, folder_id, drive_id)
+        return f'Successfully uploaded {file} as {name} to {_destination_name(folder_id, drive_id)}'
+
+    _upload(file_obj, file, engine)
+    index.add(file_obj, folder_id, drive_id)
+    return f'Successfully uploaded {file} to {_destination_name(folder_id, drive_id)}'
+
+
+def upload_single_file(drive, file, use_archive, use_direct, folder_id, drive_id, continue_upload=False, max_files=100,
+                       engine=None, compress='gzip', index=None):
+    """Upload a single file or directory to Google Drive.
+
+    With an `engine`, the uploads are scheduled on its thread pool (each file
+    of a directory separately). The result of a scheduled single file or
+    archive comes from its task, and None is returned for it here; the
+    message returned for a directory holds once its tasks succeed. Pass the
+    same FolderIndex `index` for all files uploaded to a destination.
+    """
     if file.endswith('/'):
         file = file[:-1]
 
     if not os.path.exists(file):
         return f'Error: File {file} does not exist'
 
+    if index is None:
+        index = FolderIndex(drive, engine.http if engine is not None else None)
     isdir = os.path.isdir(file)
     if isdir:
         if use_direct:
@@ -339,82 +920,164 @@ def upload_single_file(drive, file, use_archive, use_direct, folder_id, drive_id
                 use_archive = True
                 use_direct = False
             else:
-                upload_directory_direct(drive, file, folder_id, drive_id, continue_upload)
-                if drive_id:
-                    return f'Successfully uploaded directory {file} to shared drive'
-                elif folder_id:
-                    return f'Successfully uploaded directory {file} to Google Drive folder'
-                else:
-                    return f'Successfully uploaded directory {file} to Google Drive (My Drive)'
+                upload_directory_direct(drive, file, folder_id, drive_id, continue_upload, index, engine, file)
+                return f'Successfully uploaded directory {file} to {_destination_name(folder_id, drive_id)}'
 
         if not use_direct and not use_archive:
             return f'Skipping directory {file}'
 
-        if use_archive:
-            file_z = os.path.abspath(f'{os.path.basename(file)}.tgz')
-            os.system(f'cd {file} && tar -czvf {file_z} *')
-            path = file_z
-    else:
-        path = file
-
-    if continue_upload and file_exists_in_drive(drive, os.path.basename(path), folder_id, drive_id):
-        if isdir:
-            os.system(f'rm {path}')
-        return f'Skipping {path} (already exists)'
-
-    metadata = {
-        'title': os.path.basename(path),
-        'supportsAllDrives': True
-    }
-    if drive_id:
-        metadata['parents'] = [{'kind': 'drive#driveId', 'id': drive_id}]
-        metadata['driveId'] = drive_id
-    elif folder_id:
-        metadata['parents'] = [{'id': folder_id}]
-
-    file_obj = drive.CreateFile(metadata)
-    upload_file_with_progress(file_obj, path)
-
-    if drive_id:
-        result = f'Successfully uploaded {path} to shared drive'
-    elif folder_id:
-        result = f'Successfully uploaded {path} to Google Drive folder'
-    else:
-        result = f'Successfully uploaded {path} to Google Drive (My Drive)'
-
-    if isdir or path.startswith('/tmp/'):
-        assert path.endswith('.tgz')
-        os.system(f'rm {path}')
+    if engine is not None:
+        engine.submit(file, _upload_file_or_archive, drive, file, isdir, folder_id, drive_id, continue_upload,
+                      index, engine, compress)
+        return None
+    return _upload_file_or_archive(drive, file, isdir, folder_id, drive_id, continue_upload, index,
+                                   compress=compress)
 
-    return result
 
+def _md5sum(path):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(8 * 1024 * 1024), b''):
+            md5.update(block)
+    return md5.hexdigest()
 
-def upload_worker(args_tuple):
-    """Worker function for multiprocessing upload."""
-    file, use_archive, use_direct, folder_id, drive_id, continue_upload, max_files = args_tuple
 
-    import webbrowser
-    webbrowser.get = lambda using=None: None
-    webbrowser.open = lambda url, new=0, autoraise=True: None
+class SyncManifest:
+    """MD5 of local files as of their size and mtime, saved between syncs.
 
-    gauth = GoogleAuth()
-    gauth.settings['client_config_backend'] = 'file'
-    gauth.LoadClientConfigFile(client_config_file)
-    gauth.LoadCredentialsFile(credential_file)
+    Files whose size and mtime have not changed are not hashed again. Files
+    uploaded by a sync record the md5 computed by Drive, so they are never
+    hashed locally.
+    """
 
-    if gauth.access_token_expired:
+    def __init__(self, local_path, destination):
+        key = hashlib.sha1(f'{os.path.abspath(local_path)}|{destination}'.encode()).hexdigest()
+        self.path = os.path.join(manifest_dir, f'{key}.json')
         try:
-            gauth.Refresh()
-        except:
-            pass
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def md5(self, path):
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        md5 = _md5sum(path)
+        self.entries[path] = [stat.st_size, stat.st_mtime_ns, md5]
+        return md5
+
+    def record(self, path, md5):
+        if md5:
+            stat = os.stat(path)
+            self.entries[path] = [stat.st_size, stat.st_mtime_ns, md5]
+
+    def save(self):
+        os.makedirs(manifest_dir, exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+def _sync_upload(file_obj, local_path, parent_id, drive_id, index, manifest, engine=None):
+    _upload(file_obj, local_path, engine)
+    index.add(file_obj, parent_id, drive_id)
+    manifest.record(local_path, file_obj.get('md5Checksum'))
+
+
+def sync_path(drive, index, manifest, local_path, parent_id=None, drive_id=None, dry_run=False, stats=None,
+              engine=None):
+    """Upload `local_path` into a remote folder, skipping files that are unchanged.
+
+    A file is unchanged if a remote file of the same name has the same size
+    and md5. Changed files are updated in place, keeping their Drive ID.
+    """
+    name = os.path.basename(local_path)
+    entry = index.lookup(name, parent_id, drive_id)
+
+    if os.path.isdir(local_path):
+        if entry is not None and entry['is_folder']:
+            folder_id = entry['id']
+        elif dry_run:
+            print(f'Would create folder {local_path}')
+            # Placeholder with an empty listing, so all contents count as new
+            folder_id = f'new:{os.path.abspath(local_path)}'
+            index.add_empty_folder(folder_id)
+        else:
+            print(f'Creating folder: {local_path}')
+            folder_id = create_folder(drive, name, parent_id, drive_id)
+            index.add({'id': folder_id, 'title': name, 'mimeType': FOLDER_MIME_TYPE}, parent_id, drive_id)
+            index.add_empty_folder(folder_id)
+        for item in sorted(os.listdir(local_path)):
+            sync_path(drive, index, manifest, os.path.join(local_path, item), folder_id, None, dry_run, stats,
+                      engine)
+        return
+
+    local_path = os.path.abspath(local_path)
+    size = os.path.getsize(local_path)
+    if entry is None:
+        action = 'new'
+    elif entry['is_folder'] or entry['md5'] is None:
+        print(f'Skipping {local_path} (remote item is a folder or Google document)')
+        return
+    elif entry['size'] != size or manifest.md5(local_path) != entry['md5']:
+        action = 'changed'
+    else:
+        stats['unchanged'] += 1
+        return
+
+    stats[action] += 1
+    stats['bytes'] += size
+    if dry_run:
+        print(f'Would {"upload" if action == "new" else "update"} {local_path}')
+        return
+
+    if action == 'new':
+        metadata = {'title': name, 'supportsAllDrives': True}
+        if drive_id:
+            metadata['parents'] = [{'kind': 'drive#driveId', 'id': drive_id}]
+            metadata['driveId'] = drive_id
+        elif parent_id:
+            metadata['parents'] = [{'id': parent_id}]
+        file_obj = drive.CreateFile(metadata)
+    else:
+        file_obj = drive.CreateFile({'id': entry['id'], 'title': name})
+    if engine is not None:
+        engine.submit(local_path, _sync_upload, file_obj, local_path, parent_id, drive_id, index, manifest, engine)
+    else:
+        _sync_upload(file_obj, local_path, parent_id, drive_id, index, manifest)
 
-    gauth.Authorize()
-    drive = GoogleDrive(gauth)
 
+def sync_files(drive, paths, folder_id=None, drive_id=None, dry_run=False, engine=None):
+    """Sync each of `paths` into the destination folder and print a summary.
+
+    With an `engine`, the uploads run on its thread pool.
+    """
+    index = FolderIndex(drive, engine.http if engine is not None else None)
+    stats = {'new': 0, 'changed': 0, 'unchanged': 0, 'bytes': 0}
+    destination = FolderIndex.folder_key(folder_id, drive_id)
+    manifests = []
     try:
-        return upload_single_file(drive, file, use_archive, use_direct, folder_id, drive_id, continue_upload, max_files)
-    except Exception as e:
-        return f'Error uploading {file}: {str(e)}'
+        for path in paths:
+            path = path.rstrip('/') or path
+            if not os.path.exists(path):
+                print(f'Error: File {path} does not exist')
+                continue
+            manifest = SyncManifest(path, destination)
+            manifests.append(manifest)
+            sync_path(drive, index, manifest, path, folder_id, drive_id, dry_run, stats, engine)
+        if engine is not None:
+            for _, path, _, error in engine.wait():
+                if error is not None:
+                    print(f'Error uploading {path}: {str(error)}')
+    finally:
+        for manifest in manifests:
+            manifest.save()
+    verb = 'Would upload' if dry_run else 'Uploaded'
+    print(f'{verb} {stats["new"]} new and {stats["changed"]} changed files '
+          f'({stats["bytes"] / 2 ** 20:.1f} MB), {stats["unchanged"]} unchanged')
 
 
 def authenticate():
@@ -504,33 +1167,69 @@ def _get_file_size(file_path):
     return 0
 
 
-def google_drive():
-    """Currently only simple uploading is supported"""
-    args = get_parser().parse_args(sys.argv[2:])
-
-    print('Authenticating with Google Drive...')
-    gauth = authenticate()
-    drive = GoogleDrive(gauth)
-    print('Authentication successful')
-
+def resolve_destination(drive, folder):
+    """Return (folder_id, drive_id) of a folder ID or a shared drive/folder name, None if not found."""
     folder_id = None
     drive_id = None
-    if args.folder:
-        if '/' in args.folder or len(args.folder) > 50:
-            folder_id = args.folder
+    if folder:
+        if '/' in folder or len(folder) > 50:
+            folder_id = folder
             print(f'Using folder ID: {folder_id}')
         else:
-            print(f'Searching for shared drive or folder: {args.folder}')
-            drive_id, drive_name = find_shared_drive_by_name(drive, args.folder)
+            print(f'Searching for shared drive or folder: {folder}')
+            drive_id, drive_name = find_shared_drive_by_name(drive, folder)
             if drive_id:
                 print(f'Found shared drive "{drive_name}" (ID: {drive_id})')
             else:
-                folder_id = find_folder_by_name(drive, args.folder)
+                folder_id = find_folder_by_name(drive, folder)
                 if folder_id:
                     print(f'Found folder ID: {folder_id}')
                 else:
-                    print(f'Error: Shared drive or folder "{args.folder}" not found')
-                    return
+                    print(f'Error: Shared drive or folder "{folder}" not found')
+                    return None
+    return folder_id, drive_id
+
+
+def google_drive_sync():
+    args = get_sync_parser().parse_args(sys.argv[3:])
+
+    print('Authenticating with Google Drive...')
+    gauth = authenticate()
+    drive = GoogleDrive(gauth)
+    print('Authentication successful')
+
+    destination = resolve_destination(drive, args.folder)
+    if destination is None:
+        return
+    gauth.SaveCredentialsFile(credential_file)
+    engine = UploadEngine(gauth, args.njobs, args.max_memory)
+    try:
+        sync_files(engine.drive, args.files, *destination, dry_run=args.dry_run, engine=engine)
+    finally:
+        engine.shutdown()
+
+
+def google_drive():
+    """Currently only simple uploading is supported"""
+    if len(sys.argv) > 2 and sys.argv[2] == 'sync':
+        return google_drive_sync()
+    args = get_parser().parse_args(sys.argv[2:])
+
+    # Only archives are compressed, with -r or for -d directories over --max-files
+    compressor = COMPRESSORS[args.compress][0][0]
+    if (args.r or args.direct) and any(os.path.isdir(file) for file in args.files) and shutil.which(compressor) is None:
+        print(f'Error: {compressor} is not installed')
+        return
+
+    print('Authenticating with Google Drive...')
+    gauth = authenticate()
+    drive = GoogleDrive(gauth)
+    print('Authentication successful')
+
+    destination = resolve_destination(drive, args.folder)
+    if destination is None:
+        return
+    folder_id, drive_id = destination
 
     print(f'Using {args.njobs} parallel jobs for upload')
 
@@ -538,13 +1237,31 @@ def google_drive():
 
     sorted_files = sorted(args.files, key=_get_file_size, reverse=True)
 
-    upload_tasks = [
-        (file, args.r, args.direct, folder_id, drive_id, args.continue_upload, args.max_files)
-        for file in sorted_files
-    ]
-    with Pool(processes=args.njobs) as pool:
-        results = pool.map(upload_worker, upload_tasks)
-
-    for result in results:
-        print(result)
+    engine = UploadEngine(gauth, args.njobs, args.max_memory)
+    index = FolderIndex(engine.drive, engine.http)
+    results = []
+    try:
+        for file in sorted_files:
+            try:
+                result = upload_single_file(engine.drive, file, args.r, args.direct, folder_id, drive_id,
+                                            args.continue_upload, args.max_files, engine, args.compress, index)
+            except Exception as e:
+                result = f'Error uploading {file}: {str(e)}'
+            if result is not None:
+                results.append((file.rstrip('/'), result))
+        failures = []
+        for label, path, result, error in engine.wait():
+            if error is not None:
+                failures.append((label, f'Error uploading {path}: {str(error)}'))
+            elif result is not None:
+                results.append((label, result))
+    finally:
+        engine.shutdown()
+
+    failed = {label for label, _ in failures}
+    for label, result in results:
+        if label not in failed:
+            print(result)
+    for _, error in failures:
+        print(error)
     return
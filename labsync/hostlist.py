@@ -0,0 +1,263 @@
+"""SLURM hostlist expressions, e.g. `gpu[01-04,07],rack[1-2]-node[01-32]`.
+
+A `HostList` keeps the compact range form of an expression. Hosts are
+produced lazily on iteration, and membership is tested against the ranges
+without expanding them.
+"""
+import re
+from itertools import product
+
+_HOST_NUMBER_RE = re.compile(r'^(.*?)(\d+)(\D*)$')
+
+
+class RangeSet:
+    """The numbers inside one bracket, e.g. `[01-04,07]`, as (start, end, width) ranges.
+
+    `width` is the zero-padded width of the range, or 0 if it is not padded.
+    """
+    __slots__ = ('ranges',)
+
+    def __init__(self, ranges):
+        self.ranges = ranges
+
+    @classmethod
+    def parse(cls, text):
+        ranges = []
+        for part in text.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            start, _, end = part.partition('-')
+            if not start.isdigit() or (end and not end.isdigit()):
+                raise ValueError(f'Invalid hostlist range: [{text}]')
+            width = len(start) if len(start) > 1 and start.startswith('0') else 0
+            end = end or start
+            if int(end) < int(start):
+                raise ValueError(f'Invalid hostlist range: [{text}]')
+            ranges.append((int(start), int(end), width))
+        return cls(ranges)
+
+    def __len__(self):
+        return sum(end - start + 1 for start, end, _ in self.ranges)
+
+    def __iter__(self):
+        for start, end, width in self.ranges:
+            for i in range(start, end + 1):
+                yield str(i).zfill(width)
+
+    def __contains__(self, digits):
+        value = int(digits)
+        for start, end, width in self.ranges:
+            if start <= value <= end and len(digits) == max(width, len(str(value))):
+                return True
+        return False
+
+    def __getitem__(self, index):
+        for start, end, width in self.ranges:
+            count = end - start + 1
+            if index < count:
+                return str(start + index).zfill(width)
+            index -= count
+        raise IndexError(index)
+
+
+class HostPattern:
+    """One comma-free hostlist term: literals interleaved with bracket ranges."""
+    __slots__ = ('parts', '_regex')
+
+    def __init__(self, parts):
+        # Alternating [literal, RangeSet, literal, RangeSet, ..., literal]
+        self.parts = parts
+        self._regex = None
+
+    @classmethod
+    def parse(cls, text):
+        parts = []
+        literal = ''
+        pos = 0
+        while pos < len(text):
+            open_pos = text.find('[', pos)
+            if open_pos < 0:
+                literal += text[pos:]
+                break
+            close_pos = text.find(']', open_pos)
+            if close_pos < 0:
+                raise ValueError(f'Unbalanced bracket in hostlist: {text}')
+            parts.append(literal + text[pos:open_pos])
+            parts.append(RangeSet.parse(text[open_pos + 1:close_pos]))
+            literal = ''
+            pos = close_pos + 1
+        parts.append(literal)
+        return cls(parts)
+
+    @property
+    def ranges(self):
+        return self.parts[1::2]
+
+    def __len__(self):
+        count = 1
+        for range_set in self.ranges:
+            count *= len(range_set)
+        return count
+
+    def __iter__(self):
+        literals = self.parts[0::2]
+        for numbers in product(*self.ranges):
+            host = literals[0]
+            for number, literal in zip(numbers, literals[1:]):
+                host += number + literal
+            yield host
+
+    def __contains__(self, host):
+        if self._regex is None:
+            literals = [re.escape(literal) for literal in self.parts[0::2]]
+            self._regex = re.compile(r'(\d+)'.join(literals) + r'\Z')
+        match = self._regex.match(host)
+        if not match:
+            return False
+        return all(digits in range_set for digits, range_set in zip(match.groups(), self.ranges))
+
+    def __getitem__(self, index):
+        literals = self.parts[0::2]
+        numbers = []
+        for range_set in reversed(self.ranges):
+            index, offset = divmod(index, len(range_set))
+            numbers.append(range_set[offset])
+        host = literals[0]
+        for number, literal in zip(reversed(numbers), literals[1:]):
+            host += number + literal
+        return host
+
+
+def _split_terms(expression):
+    """Split a hostlist on commas that are not inside brackets."""
+    terms = []
+    depth = 0
+    start = 0
+    for i, char in enumerate(expression):
+        if char == '[':
+            depth += 1
+        elif char == ']':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            terms.append(expression[start:i])
+            start = i + 1
+    terms.append(expression[start:])
+    return [term.strip() for term in terms if term.strip()]
+
+
+class HostList:
+    """A parsed SLURM hostlist expression."""
+    __slots__ = ('expression', 'patterns')
+
+    def __init__(self, expression=''):
+        if expression in ('(null)', 'None', 'N/A'):
+            expression = ''
+        self.expression = expression
+        self.patterns = [HostPattern.parse(term) for term in _split_terms(expression)]
+
+    def __len__(self):
+        return sum(len(pattern) for pattern in self.patterns)
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    def __iter__(self):
+        for pattern in self.patterns:
+            yield from pattern
+
+    def __contains__(self, host):
+        return any(host in pattern for pattern in self.patterns)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        for pattern in self.patterns:
+            count = len(pattern)
+            if 0 <= index < count:
+                return pattern[index]
+            index -= count
+        raise IndexError(index)
+
+    def __str__(self):
+        return self.expression
+
+    def __repr__(self):
+        return f'HostList({self.expression!r})'
+
+
+def expand_hostlist(expression):
+    """Return all host names of a hostlist expression as a list."""
+    return list(HostList(expression))
+
+
+def compress_hostlist(hosts):
+    """Compress host names into a hostlist expression, e.g. `gpu[01-03,05]`.
+
+    Hosts are grouped by the text around their last number and by its
+    zero-padded width; consecutive numbers are merged into ranges.
+    """
+    by_affix = {}
+    plain = []
+    for host in dict.fromkeys(hosts):
+        match = _HOST_NUMBER_RE.match(host)
+        if not match:
+            plain.append(host)
+            continue
+        prefix, digits, suffix = match.groups()
+        by_affix.setdefault((prefix, suffix), []).append(digits)
+
+    groups = {}
+    for (prefix, suffix), all_digits in by_affix.items():
+        # `gpu09` and `gpu10` share a padded width of 2 even though only the
+        # former shows a leading zero.
+        padded_widths = {len(digits) for digits in all_digits
+                         if len(digits) > 1 and digits.startswith('0')}
+        for digits in all_digits:
+            width = len(digits) if len(digits) in padded_widths else 0
+            groups.setdefault((prefix, suffix, width), []).append(int(digits))
+
+    terms = []
+    for (prefix, suffix, width), numbers in groups.items():
+        numbers.sort()
+        ranges = []
+        start = prev = numbers[0]
+        for number in numbers[1:]:
+            if number != prev + 1:
+                ranges.append((start, prev))
+                start = number
+            prev = number
+        ranges.append((start, prev))
+        if len(numbers) == 1:
+            terms.append(f'{prefix}{str(numbers[0]).zfill(width)}{suffix}')
+            continue
+        spec = ','.join(
+            str(a).zfill(width) if a == b else f'{str(a).zfill(width)}-{str(b).zfill(width)}'
+            for a, b in ranges)
+        terms.append(f'{prefix}[{spec}]{suffix}')
+    return ','.join(terms + plain)
+
+
+class HostMap:
+    """Values attached to hostlist expressions, looked up by host name.
+
+    Lookups test membership against each expression's ranges, so large
+    hostlists are never expanded. Results are memoized per host.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._memo = {}
+
+    def add(self, expression, value):
+        self._entries.append((HostList(expression), value))
+        self._memo.clear()
+
+    def get_all(self, host):
+        if host not in self._memo:
+            self._memo[host] = [value for hostlist, value in self._entries if host in hostlist]
+        return self._memo[host]
+
+    def get(self, host, default=None):
+        values = self.get_all(host)
+        return values[0] if values else default
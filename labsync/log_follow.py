@@ -0,0 +1,123 @@
+"""Follow many growing log files at once, printing new lines with a prefix.
+
+Directories are watched with watchdog (inotify on Linux) instead of polling
+every file, and only the bytes appended since the last read are read.
+"""
+import os
+import sys
+import threading
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+# How much of an existing log is read to show its last lines.
+TAIL_BYTES = 64 * 1024
+
+
+class _FollowedFile:
+    __slots__ = ('path', 'label', 'offset', 'partial')
+
+    def __init__(self, path, label):
+        self.path = path
+        self.label = label
+        self.offset = 0
+        self.partial = b''
+
+
+class LogFollower(FileSystemEventHandler):
+    """Print lines appended to a set of files as `[label] line`."""
+
+    def __init__(self, stream=None, tail_lines=10):
+        self.stream = stream or sys.stdout
+        self.tail_lines = tail_lines
+        self.files = {}
+        self.lock = threading.Lock()
+        self.observer = Observer()
+        self.watched_dirs = set()
+
+    def add(self, path, label):
+        path = os.path.abspath(path)
+        with self.lock:
+            if path in self.files:
+                return
+            followed = self.files[path] = _FollowedFile(path, label)
+            directory = os.path.dirname(path)
+            if directory not in self.watched_dirs and os.path.isdir(directory):
+                self.observer.schedule(self, directory, recursive=False)
+                self.watched_dirs.add(directory)
+            self._print_tail(followed)
+
+    def remove(self, path):
+        path = os.path.abspath(path)
+        with self.lock:
+            followed = self.files.pop(path, None)
+            if followed is not None:
+                self._read_new(followed)
+                if followed.partial:
+                    self._write(followed.label, [followed.partial])
+
+    def _print_tail(self, followed):
+        try:
+            size = os.path.getsize(followed.path)
+        except OSError:
+            return
+        start = max(0, size - TAIL_BYTES)
+        with open(followed.path, 'rb') as f:
+            f.seek(start)
+            data = f.read(size - start)
+        followed.offset = size
+        lines = data.split(b'\n')
+        followed.partial = lines.pop()
+        if start > 0 and lines:
+            lines = lines[1:]  # first line is likely cut
+        self._write(followed.label, lines[-self.tail_lines:] if self.tail_lines else [])
+
+    def _read_new(self, followed):
+        try:
+            size = os.path.getsize(followed.path)
+        except OSError:
+            return
+        if size < followed.offset:
+            # Truncated or replaced, start over
+            followed.offset = 0
+            followed.partial = b''
+        if size == followed.offset:
+            return
+        with open(followed.path, 'rb') as f:
+            f.seek(followed.offset)
+            data = f.read(size - followed.offset)
+        followed.offset += len(data)
+        lines = (followed.partial + data).split(b'\n')
+        followed.partial = lines.pop()
+        self._write(followed.label, lines)
+
+    def _write(self, label, lines):
+        if not lines:
+            return
+        self.stream.write(''.join(
+            f'[{label}] {line.decode(errors="replace").rstrip()}\n' for line in lines))
+        self.stream.flush()
+
+    def _on_path(self, path):
+        with self.lock:
+            followed = self.files.get(os.path.abspath(path))
+            if followed is not None:
+                self._read_new(followed)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._on_path(event.src_path)
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._on_path(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._on_path(event.dest_path)
+
+    def start(self):
+        self.observer.start()
+
+    def stop(self):
+        self.observer.stop()
+        self.observer.join()
@@ -1,39 +1,90 @@
 import logging
 import argparse
+import importlib
 import sys
-from labsync.latex import latex
-from labsync.google_drive import google_drive
-from labsync.cluster import cluster
-from labsync.hf import hf
+import time
 
 logger = logging.getLogger(__name__)
 
+# Subsystem modules are imported only when their command is dispatched, so that
+# e.g. `lab ls` does not pay for importing pydrive2, datasets or huggingface_hub.
+COMMANDS = {
+    'tex': ('labsync.latex', 'latex'),
+    'google-drive': ('labsync.google_drive', 'google_drive'),
+    'cluster': ('labsync.cluster', 'cluster'),
+    'hf': ('labsync.hf', 'hf'),
+}
+
+SHORTCUTS = {
+    'gd': 'google-drive',
+    'ls': 'cluster ls',
+    'jobs': 'cluster jobs',
+    'kill': 'cluster kill',
+    'bash': 'cluster bash',
+    'hf': 'hf ls'
+}
+
+COMMAND_CHOICES = ['tex', 'google-drive', 'gd', 'cluster', 'ls', 'jobs', 'kill', 'bash', 'hf']
+
+
 def get_global_parser():
     parser = argparse.ArgumentParser(add_help=False)
     parser.add_argument('command', type=str, default='cluster',
-                        choices=['tex',
-                                'google-drive', 'gd', 'cluster', 'ls', 'jobs', 'kill', 'bash', 'hf'],
+                        choices=COMMAND_CHOICES,
                         nargs='?', help='Command of this run')
-    shortcuts = {
-        'gd': 'google-drive',
-        'ls': 'cluster ls',
-        'jobs': 'cluster jobs',
-        'kill': 'cluster kill',
-        'bash': 'cluster bash',
-        'hf': 'hf ls'
-    }
-    return parser, shortcuts
+    return parser, SHORTCUTS
+
+
+def load_command(command):
+    """Import the module implementing a command and return its entry function."""
+    module_name, func_name = COMMANDS[command]
+    module = importlib.import_module(module_name)
+    return getattr(module, func_name)
+
+
+def profile_startup():
+    """Report the import time of each subsystem in a fresh interpreter."""
+    import subprocess
+
+    print(f"{'Command':<15} {'Module':<25} {'Import time':>12}")
+    print("-" * 54)
+    for command, (module_name, _) in COMMANDS.items():
+        # Each module is timed in its own interpreter so that dependencies
+        # shared between subsystems are not attributed to whichever runs first.
+        code = (
+            'import time; t = time.perf_counter(); '
+            f'import {module_name}; '
+            'print(time.perf_counter() - t)'
+        )
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code],
+                                capture_output=True, text=True)
+        total = time.perf_counter() - start
+        if result.returncode == 0:
+            elapsed = float(result.stdout.strip().splitlines()[-1])
+            print(f"{command:<15} {module_name:<25} {elapsed * 1000:>10.1f}ms"
+                  f"  (process {total * 1000:.0f}ms)")
+        else:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'unknown error'
+            print(f"{command:<15} {module_name:<25} {'failed':>12}  ({error})")
+
 
 def cli_main():
     parser, shortcuts = get_global_parser()
 
+    if len(sys.argv) == 2 and sys.argv[1] == '--profile-startup':
+        profile_startup()
+        return
+
     if len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] in ['-h', '--help']):
         full_parser = argparse.ArgumentParser(
             description='LabSync - A development toolkit for university lab servers'
         )
         full_parser.add_argument('command', type=str,
-                                choices=['tex', 'google-drive', 'gd', 'cluster', 'ls', 'jobs', 'kill', 'bash', 'hf'],
+                                choices=COMMAND_CHOICES,
                                 nargs='?', help='Command to run')
+        full_parser.add_argument('--profile-startup', action='store_true',
+                                 help='Report import time of each subsystem and exit')
         full_parser.print_help()
         return
 
@@ -48,14 +99,8 @@ def cli_main():
                 sys.argv.insert(2, parts[1])
         else:
             args.command = expanded
-    if args.command == 'tex':
-        latex()
-    elif args.command == 'google-drive':
-        google_drive()
-    elif args.command == 'cluster':
-        cluster()
-    elif args.command == 'hf':
-        hf()
+    if args.command in COMMANDS:
+        load_command(args.command)()
 
 if __name__ == '__main__':
     cli_main()
@@ -0,0 +1,38 @@
+"""Machine-readable output of table rows, streamed as the rows are produced."""
+import csv
+import json
+import sys
+
+OUTPUT_FORMATS = ['table', 'json', 'ndjson', 'csv']
+
+
+def write_rows(rows, fields, fmt, stream=None):
+    """Write dict rows as `json`, `ndjson` or `csv`, flushing after every row.
+
+    `json` is written as an array that is opened before the first row and
+    closed after the last, so consumers can parse it incrementally.
+    """
+    stream = stream or sys.stdout
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        stream.flush()
+        for row in rows:
+            writer.writerow(row)
+            stream.flush()
+    elif fmt == 'ndjson':
+        for row in rows:
+            stream.write(json.dumps({field: row.get(field) for field in fields}) + '\n')
+            stream.flush()
+    elif fmt == 'json':
+        stream.write('[')
+        stream.flush()
+        separator = '\n'
+        for row in rows:
+            stream.write(separator + json.dumps({field: row.get(field) for field in fields}))
+            stream.flush()
+            separator = ',\n'
+        stream.write('\n]\n')
+        stream.flush()
+    else:
+        raise ValueError(f'Unknown output format: {fmt}')
@@ -0,0 +1,296 @@
+"""Parser for one-line (`-o`) `scontrol show job` / `scontrol show nodes` records.
+
+Records are turned into compact `__slots__` objects with TRES fields parsed
+into typed `Tres` values. All patterns are compiled once at import time.
+"""
+import re
+from datetime import datetime
+
+# Start of a `Key=` token. Values may contain spaces or `=` (e.g.
+# `AllocTRES=cpu=4,mem=16G`), so a key is only recognized after whitespace.
+_KEY_RE = re.compile(r'(?:^|\s)([A-Za-z][\w/:.]*)=')
+_GPU_GRES_RE = re.compile(r'(?:gres[/:])?gpu(?::([^:,=()]+))?[:=](\d+)', re.IGNORECASE)
+_GRES_IDX_RE = re.compile(r'\(IDX:([^)]*)\)')
+_MEM_RE = re.compile(r'^(\d+(?:\.\d+)?)([KMGTP]?)$', re.IGNORECASE)
+_MEM_UNITS = {'': 1, 'K': 1 / 1024, 'M': 1, 'G': 1024, 'T': 1024 ** 2, 'P': 1024 ** 3}
+
+
+def iter_fields(line):
+    """Yield (key, value) pairs of a one-line scontrol record."""
+    matches = list(_KEY_RE.finditer(line))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(line)
+        yield match.group(1), line[match.end():end].strip()
+
+
+def parse_mem_mb(value):
+    """Convert a SLURM memory string such as `16G` or `500M` to megabytes."""
+    match = _MEM_RE.match(value or '')
+    if not match:
+        return 0
+    return int(float(match.group(1)) * _MEM_UNITS[match.group(2).upper()])
+
+
+def parse_gpu_gres(value):
+    """Return (gpu_count, gpu_type) from a GRES or TRES string."""
+    if not value or value in ('(null)', 'N/A'):
+        return 0, None
+    match = _GPU_GRES_RE.search(value)
+    if not match:
+        return 0, None
+    return int(match.group(2)), match.group(1)
+
+
+def parse_gpu_indices(value):
+    """Return the GPU indices of a detail GRES such as `gpu:a100:2(IDX:0,2)`."""
+    match = _GRES_IDX_RE.search(value or '')
+    if not match or match.group(1) in ('', 'N/A'):
+        return []
+    indices = []
+    for part in match.group(1).split(','):
+        if '-' in part:
+            start, end = part.split('-', 1)
+            indices.extend(range(int(start), int(end) + 1))
+        elif part.isdigit():
+            indices.append(int(part))
+    return indices
+
+
+def parse_slurm_time(value):
+    """Parse a SLURM timestamp such as `2024-05-01T12:00:00`, None for `Unknown` etc."""
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        return None
+
+
+class Tres:
+    """Trackable resources of a job, e.g. `cpu=4,mem=16G,node=1,gres/gpu:a100=2`."""
+    __slots__ = ('cpus', 'mem_mb', 'nodes', 'gpus', 'gpu_type')
+
+    def __init__(self, cpus=0, mem_mb=0, nodes=0, gpus=0, gpu_type=None):
+        self.cpus = cpus
+        self.mem_mb = mem_mb
+        self.nodes = nodes
+        self.gpus = gpus
+        self.gpu_type = gpu_type
+
+    @classmethod
+    def parse(cls, value):
+        tres = cls()
+        if not value or value in ('(null)', 'N/A'):
+            return tres
+        for item in value.split(','):
+            if 'gpu' in item:
+                gpus, gpu_type = parse_gpu_gres(item)
+                # Untyped `gres/gpu=N` is the total; typed entries repeat it
+                if gpu_type is None or not tres.gpus:
+                    tres.gpus = gpus or tres.gpus
+                if gpu_type and not tres.gpu_type:
+                    tres.gpu_type = gpu_type
+                continue
+            key, _, amount = item.partition('=')
+            if key == 'cpu':
+                tres.cpus = int(amount) if amount.isdigit() else 0
+            elif key == 'mem':
+                tres.mem_mb = parse_mem_mb(amount)
+            elif key == 'node':
+                tres.nodes = int(amount) if amount.isdigit() else 0
+        return tres
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def __repr__(self):
+        return (f'Tres(cpus={self.cpus}, mem_mb={self.mem_mb}, nodes={self.nodes}, '
+                f'gpus={self.gpus}, gpu_type={self.gpu_type!r})')
+
+
+class JobRecord:
+    """A job from `scontrol -d show job -o`."""
+    __slots__ = ('job_id', 'array_job_id', 'array_task_id', 'name', 'user', 'state',
+                 'partition', 'node_list', 'num_nodes', 'reason', 'alloc_tres',
+                 'req_tres', 'tres_per_job', 'gpus_per_node', 'gres_gpus',
+                 'node_gres', 'mentions_gpu')
+    _TRES_SLOTS = ('alloc_tres', 'req_tres', 'tres_per_job')
+
+    def __init__(self):
+        self.job_id = None
+        self.array_job_id = None
+        self.array_task_id = None
+        self.name = ''
+        self.user = ''
+        self.state = ''
+        self.partition = ''
+        self.node_list = ''
+        self.num_nodes = 0
+        self.reason = ''
+        self.alloc_tres = None
+        self.req_tres = None
+        self.tres_per_job = None
+        self.gpus_per_node = 0
+        self.gres_gpus = 0
+        # [(node hostlist, gpu count, gpu indices)] from `-d` detail
+        self.node_gres = []
+        self.mentions_gpu = False
+
+    def to_dict(self):
+        data = {slot: getattr(self, slot) for slot in self.__slots__}
+        for slot in self._TRES_SLOTS:
+            if data[slot] is not None:
+                data[slot] = data[slot].to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls()
+        for slot in cls.__slots__:
+            if slot in data:
+                setattr(job, slot, data[slot])
+        for slot in cls._TRES_SLOTS:
+            if getattr(job, slot) is not None:
+                setattr(job, slot, Tres.from_dict(getattr(job, slot)))
+        job.node_gres = [tuple(entry) for entry in job.node_gres]
+        return job
+
+    @property
+    def gpu_count(self):
+        """Total GPUs of the job from its TRES fields, 0 if none are reported."""
+        for tres in (self.alloc_tres, self.req_tres, self.tres_per_job):
+            if tres is not None and tres.gpus:
+                return tres.gpus
+        return self.gres_gpus
+
+    @property
+    def gpu_type(self):
+        for tres in (self.alloc_tres, self.req_tres, self.tres_per_job):
+            if tres is not None and tres.gpu_type:
+                return tres.gpu_type
+        return None
+
+
+class NodeRecord:
+    """A node from `scontrol show nodes -o`."""
+    __slots__ = ('name', 'state', 'gres', 'features', 'partitions', 'cpus', 'real_memory_mb')
+
+    def __init__(self, name='', state='UNKNOWN', gres='', features='', partitions='',
+                 cpus=0, real_memory_mb=0):
+        self.name = name
+        self.state = state
+        self.gres = gres
+        self.features = features
+        self.partitions = partitions
+        self.cpus = cpus
+        self.real_memory_mb = real_memory_mb
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{key: value for key, value in data.items() if key in cls.__slots__})
+
+
+def parse_job_record(line):
+    job = JobRecord()
+    detail_nodes = None
+    mentions_gpu = False
+    for key, value in iter_fields(line):
+        if key == 'Nodes':
+            # `-d` appends repeated "Nodes=... CPU_IDs=... GRES=..." entries
+            detail_nodes = value
+        elif key == 'GRES':
+            if detail_nodes is not None:
+                gpus, _ = parse_gpu_gres(value)
+                job.node_gres.append((detail_nodes, gpus, parse_gpu_indices(value)))
+                detail_nodes = None
+        elif key == 'JobId':
+            if job.job_id is None:
+                job.job_id = value
+        elif key == 'ArrayJobId':
+            job.array_job_id = value
+        elif key == 'ArrayTaskId':
+            job.array_task_id = value
+        elif key == 'JobName':
+            job.name = value
+        elif key == 'UserId':
+            job.user = value.split('(', 1)[0]
+        elif key == 'JobState':
+            job.state = value
+        elif key == 'Partition':
+            job.partition = value
+        elif key == 'NodeList':
+            job.node_list = value
+        elif key == 'NumNodes':
+            head = value.split('-', 1)[0]
+            job.num_nodes = int(head) if head.isdigit() else 0
+        elif key == 'Reason':
+            job.reason = value
+        elif key in ('AllocTRES', 'TRES'):
+            if job.alloc_tres is None or not job.alloc_tres.gpus:
+                job.alloc_tres = Tres.parse(value)
+        elif key == 'ReqTRES':
+            job.req_tres = Tres.parse(value)
+        elif key == 'TresPerJob':
+            job.tres_per_job = Tres.parse(value)
+        elif key == 'TresPerNode':
+            job.gpus_per_node, _ = parse_gpu_gres(value)
+        elif key == 'Gres':
+            job.gres_gpus, _ = parse_gpu_gres(value)
+        if not mentions_gpu and ('gpu' in value.lower() or 'gres' in key.lower()):
+            mentions_gpu = True
+    job.mentions_gpu = mentions_gpu
+    return job
+
+
+def parse_node_record(line):
+    node = NodeRecord()
+    for key, value in iter_fields(line):
+        if key == 'NodeName':
+            node.name = value
+        elif key == 'State':
+            node.state = value
+        elif key == 'Gres':
+            node.gres = value
+        elif key in ('AvailableFeatures', 'Features'):
+            node.features = value
+        elif key == 'Partitions':
+            node.partitions = value
+        elif key == 'CPUTot':
+            node.cpus = int(value) if value.isdigit() else 0
+        elif key == 'RealMemory':
+            node.real_memory_mb = int(value) if value.isdigit() else 0
+    return node
+
+
+def parse_jobs(output):
+    """Parse `scontrol -d show job -o` output into {job_id: JobRecord}.
+
+    Array tasks are additionally keyed by their `ARRAYID_TASKID` form, which
+    is how `squeue` reports them.
+    """
+    jobs = {}
+    for line in output.splitlines():
+        if line.strip():
+            job = parse_job_record(line)
+            if job.job_id is None:
+                continue
+            jobs[job.job_id] = job
+            if job.array_job_id and job.array_task_id:
+                jobs[f'{job.array_job_id}_{job.array_task_id}'] = job
+    return jobs
+
+
+def parse_nodes(output):
+    """Parse `scontrol show nodes -o` output into {node_name: NodeRecord}."""
+    nodes = {}
+    for line in output.splitlines():
+        if line.strip():
+            node = parse_node_record(line)
+            if node.name:
+                nodes[node.name] = node
+    return nodes
@@ -19,7 +19,8 @@ setup(
       'gpustat>=1.1',
       'termcolor>=2.4.0',
       'huggingface_hub>=0.33.0',
-      'datasets>=4.0.0'
+      'datasets>=4.0.0',
+      'pyyaml>=5.1'
     ],
     url='https://github.com/shizhouxing/labsync',
     entry_points={